@@ -0,0 +1,55 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016 Christian August Reksten-Monsen
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from __future__ import print_function
+import sys
+from timeit import default_timer
+import pyvisgraph as vg
+from shortest_path import obstacles
+
+# Times VisGraph.build with an increasing number of worker processes, to
+# check how the parallel build scales with the number of cores and how evenly
+# the work is spread over the workers.
+# Usage: python benchmarks/build.py [number of obstacles] [max workers]
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    polygons, _ = obstacles(n)
+    print('Obstacle graph points: {}'.format(sum(len(p) for p in polygons)))
+    base = None
+    workers = 1
+    while workers <= max_workers:
+        graph = vg.VisGraph()
+        start = default_timer()
+        graph.build(obstacles(n)[0], workers=workers, status=False)
+        elapsed = default_timer() - start
+        base = base or elapsed
+        utilisation = [w['utilisation']
+                       for w in graph.build_stats['workers'].values()]
+        print('{} workers: {:.2f}s, speedup {:.2f}x, visgraph edges: {}, '
+              'worker utilisation {:.0%}-{:.0%}'.format(
+                  workers, elapsed, base / elapsed,
+                  len(graph.visgraph.get_edges()), min(utilisation),
+                  max(utilisation)))
+        workers *= 2
@@ -0,0 +1,61 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016 Christian August Reksten-Monsen
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from __future__ import print_function
+import random
+import sys
+from timeit import default_timer
+import pyvisgraph as vg
+from engines import obstacles
+
+# Times shortest_path queries between a few places outside the visibility
+# graph, like ports, with and without the endpoint cache (see
+# VisGraph.cache_endpoints), and shows its hits and misses. The endpoints
+# are given with some noise, which the cache rounds away.
+# Usage: python benchmarks/endpoint_cache.py [number of obstacles]
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 36
+    size = (int(n ** 0.5) + 1) * 10
+    graph = vg.VisGraph()
+    graph.build(obstacles(n), status=False)
+    rand = random.Random(1)
+    ports = [(0, rand.uniform(0, size)) for _ in range(4)]
+    ports += [(size, rand.uniform(0, size)) for _ in range(4)]
+    queries = []
+    for _ in range(200):
+        (x1, y1), (x2, y2) = rand.sample(ports, 2)
+        queries.append((vg.Point(x1 + rand.uniform(0, 1e-6), y1),
+                        vg.Point(x2 + rand.uniform(0, 1e-6), y2)))
+    for resolution in (None, 1e-3):
+        if resolution:
+            cache = graph.cache_endpoints(resolution=resolution)
+        start = default_timer()
+        for origin, destination in queries:
+            graph.shortest_path(origin, destination)
+        elapsed = (default_timer() - start) / len(queries)
+        if resolution:
+            print('Endpoint cache: {:.2f}ms per query, {} hits, {} '
+                  'misses'.format(elapsed * 1000, cache.hits, cache.misses))
+        else:
+            print('No cache: {:.2f}ms per query'.format(elapsed * 1000))
@@ -0,0 +1,101 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016 Christian August Reksten-Monsen
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from __future__ import print_function
+import random
+import sys
+from math import cos, sin, pi
+from timeit import default_timer
+import pyvisgraph as vg
+
+# Compares the build time of the 'sweep' and 'kinetic' engines (see
+# VisGraph.build) for growing inputs, to find where the kinetic engine gets
+# faster, and checks that both give the same visibility graph. The inputs
+# are star-shaped obstacles on a grid, turned by a random angle so no two
+# Points are at the same height, and a wiggly coastline around small
+# islands.
+# Usage: python benchmarks/engines.py [obstacles|coast] [largest size]
+
+
+def obstacles(n, seed=0):
+    """Random non-overlapping star-shaped obstacles on a grid, each turned
+    by a random angle."""
+    rand = random.Random(seed)
+    side = int(n ** 0.5) + 1
+    polygons = []
+    for k in range(n):
+        cx, cy = (k % side) * 10 + 5, (k // side) * 10 + 5
+        m = rand.randint(4, 12)
+        phase = rand.uniform(0, 2 * pi)
+        polygons.append([vg.Point(
+            cx + rand.uniform(1, 4) * cos(2 * pi * i / m + phase),
+            cy + rand.uniform(1, 4) * sin(2 * pi * i / m + phase))
+            for i in range(m)])
+    return polygons
+
+
+def coast(n, seed=0):
+    """A coastline of n Points around n / 20 small islands."""
+    rand = random.Random(seed)
+    polygons = [[]]
+    for k in range(n):
+        r = 30 + sin(14 * pi * k / n) + rand.uniform(0, 0.5)
+        polygons[0].append(vg.Point(r * cos(2 * pi * k / n),
+                                    r * sin(2 * pi * k / n)))
+    centers = []
+    for _ in range(n // 20):
+        cx, cy = rand.uniform(-20, 20), rand.uniform(-20, 20)
+        if any(abs(cx - x) < 2 and abs(cy - y) < 2 for x, y in centers):
+            continue
+        centers.append((cx, cy))
+        polygons.append([vg.Point(cx + rand.uniform(0.3, 0.9) * cos(i + 0.3),
+                                  cy + rand.uniform(0.3, 0.9) * sin(i + 0.3))
+                         for i in range(6)])
+    return polygons
+
+
+def build(polygons, engine):
+    graph = vg.VisGraph()
+    start = default_timer()
+    graph.build(polygons, status=False, engine=engine)
+    return default_timer() - start, graph.visgraph.get_edges()
+
+
+if __name__ == '__main__':
+    inputs = sys.argv[1] if len(sys.argv) > 1 else 'obstacles'
+    largest = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    if inputs == 'obstacles':
+        make, sizes = obstacles, [4, 9, 16, 36, 64, 100]
+    else:
+        make, sizes = coast, [50, 100, 200, 400, 600]
+    if largest:
+        sizes = [n for n in sizes if n < largest] + [largest]
+    for n in sizes:
+        polygons = make(n)
+        sweep_time, sweep_edges = build(polygons, 'sweep')
+        kinetic_time, kinetic_edges = build(polygons, 'kinetic')
+        print('{} {}: points {}, edges {}, sweep {:.2f}s, kinetic {:.2f}s, '
+              'speedup {:.1f}x, same edges: {}'.format(
+                  inputs, n, sum(len(p) for p in polygons), len(sweep_edges),
+                  sweep_time, kinetic_time, sweep_time / kinetic_time,
+                  sweep_edges == kinetic_edges))
@@ -0,0 +1,100 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016 Christian August Reksten-Monsen
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from __future__ import print_function
+import random
+import sys
+from timeit import default_timer
+import pyvisgraph as vg
+from pyvisgraph.visible_vertices import edge_distance
+from engines import obstacles
+
+# Times shortest_path queries with Dijkstra, A* and A* with landmarks (see
+# VisGraph.precompute_landmarks) on obstacles between long walls, which the
+# paths have to go around like continents. All should find paths of the
+# same length. The queries are between Points of the visibility graph, and
+# between temporary Points.
+# Usage: python benchmarks/landmarks.py [number of obstacles] [landmarks]
+
+
+def walls(n):
+    """Obstacles with a wall between each row of them, open at the left or
+    right end in turn."""
+    side = int(n ** 0.5) + 1
+    polygons = obstacles(n)
+    for row in range(1, side):
+        y = row * 10 + 0.1 * (row % 3)
+        x = 10 if row % 2 else 0
+        width = side * 10 - 10
+        polygons.append([vg.Point(x, y - 0.3), vg.Point(x + width, y - 0.2),
+                         vg.Point(x + width, y + 0.2), vg.Point(x, y + 0.3)])
+    return polygons, side * 10
+
+
+def path_length(path):
+    return sum(edge_distance(a, b) for a, b in zip(path, path[1:]))
+
+
+def time_queries(graph, queries, algorithm):
+    start = default_timer()
+    paths = [graph.shortest_path(o, d, algorithm) for o, d in queries]
+    return (default_timer() - start) / len(queries), paths
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 36
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    polygons, size = walls(n)
+    graph = vg.VisGraph()
+    graph.build(polygons, status=False)
+    start = default_timer()
+    graph.precompute_landmarks(k)
+    print('Visibility graph points: {}, {} landmarks in {:.2f}s'.format(
+        len(graph.visgraph.get_points()), k, default_timer() - start))
+
+    rand = random.Random(1)
+    points = graph.visgraph.get_points()
+    existing = [(rand.choice(points), rand.choice(points)) for _ in range(50)]
+    temporary = [(vg.Point(rand.uniform(0, size), 2),
+                  vg.Point(rand.uniform(0, size), size - 2))
+                 for _ in range(10)]
+    landmarks = graph.landmarks
+    for name, queries in (('Existing points', existing),
+                          ('Temporary points', temporary)):
+        times = []
+        difference = 0
+        for algorithm in ('dijkstra', 'astar', 'alt'):
+            graph.landmarks = landmarks if algorithm == 'alt' else None
+            elapsed, paths = time_queries(
+                graph, queries, 'dijkstra' if algorithm == 'dijkstra'
+                else 'astar')
+            times.append(elapsed * 1000)
+            if algorithm == 'dijkstra':
+                expected = [path_length(path) for path in paths]
+            difference = max([difference] + [
+                abs(path_length(path) - length)
+                for path, length in zip(paths, expected)])
+        print('{}: Dijkstra {:.2f}ms, A* {:.2f}ms, A* with landmarks '
+              '{:.2f}ms per query, largest path length difference '
+              '{:.2g}'.format(name, times[0], times[1], times[2],
+                              difference))
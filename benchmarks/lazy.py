@@ -0,0 +1,70 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016 Christian August Reksten-Monsen
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from __future__ import print_function
+import random
+import sys
+from timeit import default_timer
+import pyvisgraph as vg
+from pyvisgraph.visible_vertices import edge_distance
+from engines import obstacles
+
+# Compares one-off queries with shortest_path_lazy, which needs no
+# visibility graph, with building the visibility graph and querying it.
+# The lazy queries are timed once with an empty cache and again with the
+# cache filled by the first round. All should find paths of the same length.
+# Usage: python benchmarks/lazy.py [number of obstacles]
+
+
+def path_length(path):
+    return sum(edge_distance(a, b) for a, b in zip(path, path[1:]))
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    polygons = obstacles(n)
+    size = (int(n ** 0.5) + 1) * 10
+    rand = random.Random(1)
+    queries = [(vg.Point(0, rand.uniform(0, size)),
+                vg.Point(size, rand.uniform(0, size))) for _ in range(5)]
+
+    graph = vg.VisGraph()
+    start = default_timer()
+    graph.build(polygons, status=False)
+    build_time = default_timer() - start
+    start = default_timer()
+    expected = [path_length(graph.shortest_path(o, d)) for o, d in queries]
+    query_time = (default_timer() - start) / len(queries)
+    print('Build {:.2f}s, then {:.2f}ms per query'.format(
+        build_time, query_time * 1000))
+
+    lazy = vg.VisGraph()
+    lazy.graph = vg.Graph(obstacles(n))
+    for label in ('empty cache', 'filled cache'):
+        start = default_timer()
+        lengths = [path_length(lazy.shortest_path_lazy(o, d))
+                   for o, d in queries]
+        lazy_time = (default_timer() - start) / len(queries)
+        print('Lazy, {}: {:.2f}ms per query, largest path length difference '
+              '{:.2g}'.format(label, lazy_time * 1000, max(
+                  abs(a - b) for a, b in zip(expected, lengths))))
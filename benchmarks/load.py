@@ -0,0 +1,58 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016 Christian August Reksten-Monsen
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from __future__ import print_function
+import os
+import sys
+import tempfile
+from timeit import default_timer
+import pyvisgraph as vg
+from shortest_path import obstacles
+
+# Compares loading a visibility graph from a pickle file and from a binary
+# graph file, and the time of the first shortest path query after loading.
+# Usage: python benchmarks/load.py [number of obstacles]
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    polygons, size = obstacles(n)
+    graph = vg.VisGraph()
+    graph.build(polygons, status=False)
+    print('Visgraph edges: {}'.format(len(graph.visgraph.get_edges())))
+    directory = tempfile.mkdtemp()
+    for binary in (False, True):
+        filename = os.path.join(directory, 'graph.pvg' if binary else
+                                'graph.pk1')
+        graph.save(filename, binary=binary)
+        loaded = vg.VisGraph()
+        start = default_timer()
+        loaded.load(filename)
+        load_time = default_timer() - start
+        start = default_timer()
+        loaded.shortest_path(vg.Point(0, 0), vg.Point(size, size))
+        query_time = default_timer() - start
+        print('{}: {:.1f} MB, load {:.4f}s, first query {:.4f}s'.format(
+            'binary' if binary else 'pickle',
+            os.path.getsize(filename) / 1e6, load_time, query_time))
+        os.remove(filename)
+    os.rmdir(directory)
@@ -0,0 +1,90 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016 Christian August Reksten-Monsen
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from __future__ import print_function
+import sys
+from random import Random
+from timeit import default_timer
+from pyvisgraph.graph import Graph, Point
+from pyvisgraph.visible_vertices import visible_vertices, OPEN_EDGES_BACKENDS
+from pyvisgraph.visible_vertices import SkipListOpenEdges
+
+# Compares the open edge backends of the rotational sweep. The obstacles are
+# columns of thin, wide slabs, so a sweep has about two open edges per slab
+# in a column at once, like a sweep across a dense coastline.
+# Then times only the inserts and deletes of the two structures, at growing
+# numbers of open edges, to show where the skip list gets faster than the
+# list. Sweeps rarely get there, as the list only moves pointers.
+# Usage: python benchmarks/open_edges.py [slabs per column]
+
+
+def slabs(rows, columns=4, width=20.0, height=0.2, gap=0.3):
+    polygons = []
+    for c in range(columns):
+        x = c * (width + 1.0)
+        for r in range(rows):
+            y = r * (height + gap) + c * 0.01
+            polygons.append([Point(x, y), Point(x + width, y + 0.05),
+                             Point(x + width, y + height),
+                             Point(x, y + height)])
+    return polygons
+
+
+def print_insert_delete_times(operations=20000):
+    for k in (10**3, 10**4, 10**5, 10**6):
+        rand = Random(0)
+        positions = [rand.randrange(k) for _ in range(operations)]
+        open_list = list(range(k))
+        start = default_timer()
+        for i in positions:
+            open_list.insert(i, i)
+            del open_list[i]
+        list_time = default_timer() - start
+        skip_list = SkipListOpenEdges()
+        for i in range(k):
+            skip_list._insert_at(i, i)
+        start = default_timer()
+        for i in positions:
+            skip_list._insert_at(i, i)
+            skip_list._delete_at(i)
+        skip_time = default_timer() - start
+        print('{:>8} open edges, insert and delete: list {:.2f}us, '
+              'skiplist {:.2f}us'.format(k, list_time / operations * 1e6,
+                                         skip_time / operations * 1e6))
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    graph = Graph(slabs(rows))
+    points = graph.get_points()[::max(1, len(graph.get_points()) // 50)]
+    print('Obstacle graph points: {}, sweeps timed: {}'.format(
+        len(graph.get_points()), len(points)))
+    results = {}
+    for backend in sorted(OPEN_EDGES_BACKENDS):
+        start = default_timer()
+        results[backend] = [visible_vertices(p, graph, backend=backend)
+                            for p in points]
+        print('{:>10}: {:.3f}s'.format(backend, default_timer() - start))
+    print('Identical output: {}'.format(
+        all(r == results['list'] for r in results.values())))
+    print_insert_delete_times()
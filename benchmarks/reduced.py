@@ -0,0 +1,64 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016 Christian August Reksten-Monsen
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from __future__ import print_function
+import random
+import sys
+from timeit import default_timer
+import pyvisgraph as vg
+from pyvisgraph.visible_vertices import edge_distance
+from shortest_path import obstacles
+
+# Compares a full and a reduced visibility graph (see VisGraph.build): build
+# time, edges, and the time per shortest path query, which should find paths
+# of the same length.
+# Usage: python benchmarks/reduced.py [number of obstacles]
+
+
+def path_length(path):
+    return sum(edge_distance(a, b) for a, b in zip(path, path[1:]))
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 36
+    polygons, size = obstacles(n)
+    rand = random.Random(1)
+    queries = [(vg.Point(0, rand.uniform(0, size)),
+                vg.Point(size, rand.uniform(0, size))) for _ in range(10)]
+    lengths = {}
+    for reduced in (False, True):
+        graph = vg.VisGraph()
+        start = default_timer()
+        graph.build(obstacles(n)[0], status=False, reduced=reduced)
+        build_time = default_timer() - start
+        start = default_timer()
+        paths = [graph.shortest_path(o, d) for o, d in queries]
+        query_time = (default_timer() - start) / len(queries)
+        lengths[reduced] = [path_length(path) for path in paths]
+        print('{}: build {:.2f}s, points {}, edges {}, {:.2f}ms per '
+              'query'.format('Reduced' if reduced else 'Full', build_time,
+                             len(graph.visgraph.get_points()),
+                             len(graph.visgraph.get_edges()),
+                             query_time * 1000))
+    print('Largest path length difference: {:.2g}'.format(
+        max(abs(a - b) for a, b in zip(lengths[False], lengths[True]))))
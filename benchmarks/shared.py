@@ -0,0 +1,97 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016 Christian August Reksten-Monsen
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from __future__ import print_function
+import gc
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from multiprocessing import get_context
+import pyvisgraph as vg
+from shortest_path import obstacles
+
+# Saves a visibility graph as a pickle file and as a binary graph file. For
+# each, a fresh process loads the graph and forks worker processes that run
+# shortest path queries against it, and the memory each worker had to copy
+# from its parent (private dirty pages) is reported. Linux only, as it reads
+# /proc/self/smaps_rollup.
+# Usage: python benchmarks/shared.py [number of obstacles] [workers]
+
+graph = None
+size = None
+
+
+def private_dirty():
+    with open('/proc/self/smaps_rollup') as f:
+        return sum(int(line.split()[1]) * 1024 for line in f
+                   if line.startswith('Private_Dirty'))
+
+
+def queries(seed):
+    r = random.Random(seed)
+    for _ in range(20):
+        origin = vg.Point(r.uniform(0, size), r.uniform(0, size))
+        destination = vg.Point(r.uniform(0, size), r.uniform(0, size))
+        if graph.point_in_polygon(origin) == -1:
+            graph.shortest_path(origin, destination)
+    return private_dirty()
+
+
+def serve(filename, workers):
+    global graph
+    graph = vg.VisGraph()
+    graph.load(filename)
+    gc.collect()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+    pool = get_context('fork').Pool(workers)
+    private = pool.map(queries, range(workers))
+    pool.terminate()
+    return private
+
+
+if __name__ == '__main__':
+    if sys.argv[1] == '--serve':
+        size = float(sys.argv[4])
+        private = serve(sys.argv[2], int(sys.argv[3]))
+        print('private memory per worker {:.1f}-{:.1f} MB'.format(
+            min(private) / 1e6, max(private) / 1e6))
+        sys.exit()
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    workers = sys.argv[2] if len(sys.argv) > 2 else '4'
+    polygons, size = obstacles(n)
+    built = vg.VisGraph()
+    built.build(polygons, status=False)
+    print('Visgraph edges: {}'.format(len(built.visgraph.get_edges())))
+    directory = tempfile.mkdtemp()
+    for binary in (False, True):
+        filename = os.path.join(directory, 'graph')
+        built.save(filename, binary=binary)
+        print('binary: ' if binary else 'pickle: ', end='')
+        sys.stdout.flush()
+        subprocess.call([sys.executable, __file__, '--serve', filename,
+                         workers, str(size)])
+        os.remove(filename)
+    os.rmdir(directory)
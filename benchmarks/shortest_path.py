@@ -0,0 +1,86 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016 Christian August Reksten-Monsen
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from __future__ import print_function
+import random
+import sys
+from copy import deepcopy
+from math import cos, sin, pi
+from timeit import default_timer
+import pyvisgraph as vg
+
+# Compares the time per shortest path query on a Graph visibility graph with
+# the same queries on its CompactGraph, which runs Dijkstra on integer vertex
+# ids and precomputed edge lengths. Both the search alone (origin and
+# destination in the visibility graph) and the full query (temporary origin
+# and destination) are timed, with Dijkstra and with A*.
+# Usage: python benchmarks/shortest_path.py [number of obstacles]
+
+
+def obstacles(n, seed=0):
+    """Random non-overlapping star-shaped obstacles on a grid."""
+    rand = random.Random(seed)
+    side = int(n ** 0.5) + 1
+    polygons = []
+    for k in range(n):
+        cx, cy = (k % side) * 10 + 5, (k // side) * 10 + 5
+        m = rand.randint(4, 12)
+        polygons.append([vg.Point(cx + rand.uniform(1, 4) * cos(2 * pi * i / m),
+                                  cy + rand.uniform(1, 4) * sin(2 * pi * i / m))
+                         for i in range(m)])
+    return polygons, side * 10
+
+
+def time_queries(graph, queries, algorithm='dijkstra'):
+    start = default_timer()
+    paths = [graph.shortest_path(o, d, algorithm) for o, d in queries]
+    return (default_timer() - start) / len(queries), paths
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 36
+    polygons, size = obstacles(n)
+    graph = vg.VisGraph()
+    graph.build(polygons, status=False)
+    compact = deepcopy(graph)
+    compact.compact()
+    print('Visibility graph points: {} edges: {}'.format(
+        len(graph.visgraph.get_points()), len(graph.visgraph.get_edges())))
+
+    rand = random.Random(1)
+    points = graph.visgraph.get_points()
+    existing = [(rand.choice(points), rand.choice(points)) for _ in range(50)]
+    temporary = [(vg.Point(0, rand.uniform(0, size)),
+                  vg.Point(size, rand.uniform(0, size))) for _ in range(10)]
+    for name, queries in (('Existing points', existing),
+                          ('Temporary points', temporary)):
+        graph_time, graph_paths = time_queries(graph, queries)
+        compact_time, compact_paths = time_queries(compact, queries)
+        print('{}: Graph {:.2f}ms, CompactGraph {:.2f}ms per query, '
+              'speedup {:.1f}x, same paths: {}'.format(
+                  name, graph_time * 1000, compact_time * 1000,
+                  graph_time / compact_time, graph_paths == compact_paths))
+        graph_time, _ = time_queries(graph, queries, 'astar')
+        compact_time, _ = time_queries(compact, queries, 'astar')
+        print('{} with A*: Graph {:.2f}ms, CompactGraph {:.2f}ms per '
+              'query'.format(name, graph_time * 1000, compact_time * 1000))
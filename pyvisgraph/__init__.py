@@ -1,3 +1,4 @@
 from __future__ import division
 from pyvisgraph.graph import Point, Edge, Graph
+from pyvisgraph.compact_graph import CompactGraph
 from pyvisgraph.vis_graph import VisGraph
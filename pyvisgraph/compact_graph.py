@@ -0,0 +1,271 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016 Christian August Reksten-Monsen
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from __future__ import division
+from array import array
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+from math import sqrt
+import sys
+
+from pyvisgraph.graph import Point, Edge
+
+# Typecode of the arrays of offsets into the neighbour and polygon edge
+# arrays. Python 2 has no 'q', and its 'l' has 64 bits on most platforms.
+OFFSET_TYPECODE = 'q' if sys.version_info[0] == 3 else 'l'
+
+
+class CompactGraph(object):
+    """
+    A read-only Graph stored in flat arrays instead of Point and Edge objects.
+
+    Points are interned to integer vertex ids, in (x, y) order, and their
+    coordinates and polygon ids are kept in the arrays *xs*, *ys* and
+    *polygon_ids*. The adjacency is stored in CSR form: the neighbours of
+    vertex i are neighbours[offsets[i]:offsets[i + 1]], and if edge lengths
+    were precomputed, lengths[j] is the length of the edge to neighbours[j].
+    Every edge is stored once in each direction, so a graph with n points and
+    m edges takes about 28n + 24m bytes.
+
+    The edges of polygon k are stored as pairs of vertex ids in
+    polygon_edges[2 * polygon_offsets[k]:2 * polygon_offsets[k + 1]], and
+    *polygons* maps k to a set of those Edges, created each time it is
+    looked up.
+
+    CompactGraph can be used in place of a Graph for the visibility graph or
+    the obstacle graph of a VisGraph: it supports the same lookups (point in
+    graph, graph[point], get_points, get_edges, polygons), creating Point and
+    Edge objects as they are asked for. It can not be changed once created.
+    The arrays can be any sequences supporting len, indexing and slicing,
+    like the memoryviews of a memory-mapped graph file, see graph_file.
+    """
+
+    # Like Graph.version, which never changes here
+    version = 0
+
+    def __init__(self, xs, ys, polygon_ids, offsets, neighbours, lengths=None,
+                 polygon_offsets=None, polygon_edges=None):
+        self.xs = xs
+        self.ys = ys
+        self.polygon_ids = polygon_ids
+        self.offsets = offsets
+        self.neighbours = neighbours
+        self.lengths = lengths
+        if polygon_offsets is None:
+            polygon_offsets = array(OFFSET_TYPECODE, [0])
+            polygon_edges = array('i')
+        self.polygon_offsets = polygon_offsets
+        self.polygon_edges = polygon_edges
+
+    @classmethod
+    def from_graph(cls, graph, lengths=True):
+        """Create a CompactGraph from a Graph (or another CompactGraph).
+
+        Set lengths=False to not precompute the edge lengths.
+        """
+        points = sorted(graph.get_points(), key=lambda p: (p.x, p.y))
+        ids = dict((p, i) for i, p in enumerate(points))
+        xs = array('d', [p.x for p in points])
+        ys = array('d', [p.y for p in points])
+        polygon_ids = array('i', [p.polygon_id for p in points])
+        offsets = array(OFFSET_TYPECODE, [0])
+        neighbours = array('i')
+        for p in points:
+            adjacent = sorted(ids[q] for q in graph.get_adjacent_points(p))
+            neighbours.extend(adjacent)
+            offsets.append(len(neighbours))
+        polygon_offsets = array(OFFSET_TYPECODE, [0])
+        polygon_edges = array('i')
+        polygons = getattr(graph, 'polygons', {})
+        for k in range(max(polygons) + 1 if polygons else 0):
+            for edge in polygons.get(k, ()):
+                polygon_edges.append(ids[edge.p1])
+                polygon_edges.append(ids[edge.p2])
+            polygon_offsets.append(len(polygon_edges) // 2)
+        compact = cls(xs, ys, polygon_ids, offsets, neighbours, None,
+                      polygon_offsets, polygon_edges)
+        if lengths:
+            compact.lengths = array('d', (compact.edge_length(i, j)
+                                          for i in range(len(points))
+                                          for j in compact.adjacent(i)))
+        return compact
+
+    @property
+    def polygons(self):
+        return CompactPolygons(self)
+
+    def vertex_id(self, point):
+        """Return the vertex id of point, -1 if point is not in the graph."""
+        xs = self.xs
+        ys = self.ys
+        x = point.x
+        y = point.y
+        lo = 0
+        hi = len(xs)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if xs[mid] < x or (xs[mid] == x and ys[mid] < y):
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(xs) and xs[lo] == x and ys[lo] == y:
+            return lo
+        return -1
+
+    def point(self, i):
+        """Return the Point with vertex id i."""
+        return Point(self.xs[i], self.ys[i], self.polygon_ids[i])
+
+    def adjacent(self, i):
+        """Return the vertex ids adjacent to vertex id i."""
+        return self.neighbours[self.offsets[i]:self.offsets[i + 1]]
+
+    def edge_length(self, i, j):
+        """Return the Euclidean distance between vertex ids i and j."""
+        dx = self.xs[j] - self.xs[i]
+        dy = self.ys[j] - self.ys[i]
+        return sqrt(dx**2 + dy**2)
+
+    def get_adjacent_points(self, point):
+        i = self.vertex_id(point)
+        if i == -1:
+            return []
+        return [self.point(j) for j in self.adjacent(i)]
+
+    def get_points(self):
+        return [self.point(i) for i in range(len(self.xs))]
+
+    def get_edges(self):
+        edges = set()
+        for i in range(len(self.xs)):
+            p = self.point(i)
+            for j in self.adjacent(i):
+                if i < j:
+                    edges.add(Edge(p, self.point(j)))
+        return edges
+
+    def segments(self):
+        """Return the (x1, y1, x2, y2) tuples of the edges, in vertex id
+        order, without creating Edges."""
+        xs = self.xs
+        ys = self.ys
+        return [(xs[i], ys[i], xs[j], ys[j])
+                for i in range(len(xs)) for j in self.adjacent(i) if i < j]
+
+    def polygon_segments(self, polygon_id):
+        """Return the (x1, y1, x2, y2) tuples of the edges of the polygon with
+        polygon_id, without creating Edges."""
+        offsets = self.polygon_offsets
+        edges = self.polygon_edges
+        xs = self.xs
+        ys = self.ys
+        segments = []
+        for e in range(offsets[polygon_id], offsets[polygon_id + 1]):
+            i = edges[2 * e]
+            j = edges[2 * e + 1]
+            segments.append((xs[i], ys[i], xs[j], ys[j]))
+        return segments
+
+    def __getstate__(self):
+        # Memoryviews can not be pickled, store them as arrays.
+        state = dict(self.__dict__)
+        for name, value in state.items():
+            if isinstance(value, memoryview):
+                state[name] = array(value.format, value)
+        state.pop('_polygon_index', None)
+        state.pop('_interval_index', None)
+        state.pop('_point_arrays', None)
+        return state
+
+    def __setstate__(self, state):
+        state.setdefault('polygon_offsets', array(OFFSET_TYPECODE, [0]))
+        state.setdefault('polygon_edges', array('i'))
+        self.__dict__.update(state)
+
+    def add_edge(self, edge):
+        raise TypeError("CompactGraph can not be changed, convert to a Graph "
+                        "before adding edges")
+
+    def __len__(self):
+        return len(self.xs)
+
+    def __contains__(self, item):
+        if isinstance(item, Point):
+            return self.vertex_id(item) != -1
+        if isinstance(item, Edge):
+            i = self.vertex_id(item.p1)
+            j = self.vertex_id(item.p2)
+            return i != -1 and j != -1 and j in self.adjacent(i)
+        return False
+
+    def __getitem__(self, point):
+        i = self.vertex_id(point)
+        if i == -1:
+            return set()
+        p = self.point(i)
+        return set(Edge(p, self.point(j)) for j in self.adjacent(i))
+
+    def __str__(self):
+        res = ""
+        for i in range(len(self.xs)):
+            p = self.point(i)
+            res += "\n" + str(p) + ": "
+            for j in self.adjacent(i):
+                res += str(Edge(p, self.point(j)))
+        return res
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class CompactPolygons(Mapping):
+    """
+    The polygons of a CompactGraph, as a read-only mapping from polygon id to
+    the set of Edges of the polygon.
+
+    Nothing is cached: the Edges are created from the arrays of the graph on
+    every lookup and freed after use. A CompactGraph reading from a shared
+    memory-mapped file therefore never builds up Point and Edge objects, and
+    its memory pages stay shared between processes.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, polygon_id):
+        offsets = self.graph.polygon_offsets
+        if not 0 <= polygon_id < len(offsets) - 1:
+            raise KeyError(polygon_id)
+        edges = self.graph.polygon_edges
+        point = self.graph.point
+        return set(Edge(point(edges[2 * e]), point(edges[2 * e + 1]))
+                   for e in range(offsets[polygon_id],
+                                  offsets[polygon_id + 1]))
+
+    def __iter__(self):
+        return iter(range(len(self.graph.polygon_offsets) - 1))
+
+    def __len__(self):
+        return len(self.graph.polygon_offsets) - 1
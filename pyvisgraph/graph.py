@@ -105,27 +105,67 @@ class Graph(object):
     edges that make up the polygon. Note only polygons with 3 or more Points
     will be classified as a polygon. Non-polygons like just one Point will be
     given a polygon ID of -1 and not maintained in the dict.
+
+    *version* is increased by every change of the Edges, so caches of
+    results for the Graph can tell when they are out of date.
     """
 
+    version = 0
+
     def __init__(self, polygons):
         self.graph = defaultdict(set)
         self.edges = set()
         self.polygons = defaultdict(set)
+        self._polygon_index = None
+        self._interval_index = None
+        self._point_arrays = None
         pid = 0
         for polygon in polygons:
-            if polygon[0] == polygon[-1] and len(polygon) > 1:
-                polygon.pop()
-            for i, point in enumerate(polygon):
-                sibling_point = polygon[(i + 1) % len(polygon)]
-                edge = Edge(point, sibling_point)
-                if len(polygon) > 2:
-                    point.polygon_id = pid
-                    sibling_point.polygon_id = pid
-                    self.polygons[pid].add(edge)
-                self.add_edge(edge)
-            if len(polygon) > 2:
+            if self._add_polygon(polygon, pid) != -1:
                 pid += 1
 
+    def add_polygon(self, polygon, polygon_id=None):
+        """Add polygon, a list of in-order Points, and return its polygon
+        ID. Unless polygon_id is given, the ID is one more than the largest
+        ID in the graph. Returns -1 if polygon has fewer than 3 Points."""
+        if polygon_id is None:
+            polygon_id = max([-1] + list(self.polygons)) + 1
+        return self._add_polygon(polygon, polygon_id)
+
+    def _add_polygon(self, polygon, pid):
+        self._polygon_index = None
+        if polygon[0] == polygon[-1] and len(polygon) > 1:
+            polygon.pop()
+        for i, point in enumerate(polygon):
+            sibling_point = polygon[(i + 1) % len(polygon)]
+            edge = Edge(point, sibling_point)
+            if len(polygon) > 2:
+                point.polygon_id = pid
+                sibling_point.polygon_id = pid
+                self.polygons[pid].add(edge)
+            self.add_edge(edge)
+        return pid if len(polygon) > 2 else -1
+
+    def remove_polygon(self, polygon_id):
+        """Remove the polygon with polygon_id and return its Edges. Its
+        Points are removed as well, unless they have other Edges."""
+        edges = self.polygons.pop(polygon_id)
+        self._polygon_index = None
+        for edge in edges:
+            self.remove_edge(edge)
+        return edges
+
+    def remove_edge(self, edge):
+        """Remove edge, and its Points if they have no other Edges."""
+        for point in (edge.p1, edge.p2):
+            if point in self.graph:
+                self.graph[point].discard(edge)
+                if not self.graph[point]:
+                    del self.graph[point]
+        self.edges.discard(edge)
+        self._interval_index = self._point_arrays = None
+        self.version += 1
+
     def get_adjacent_points(self, point):
         return [edge.get_adjacent(point) for edge in self[point]]
 
@@ -139,6 +179,17 @@ class Graph(object):
         self.graph[edge.p1].add(edge)
         self.graph[edge.p2].add(edge)
         self.edges.add(edge)
+        self._interval_index = self._point_arrays = None
+        self.version += 1
+
+    def __getstate__(self):
+        # The polygon and interval indexes (see spatial) and the point
+        # arrays (see kernels) are built again when needed.
+        state = dict(self.__dict__)
+        state.pop('_polygon_index', None)
+        state.pop('_interval_index', None)
+        state.pop('_point_arrays', None)
+        return state
 
     def __contains__(self, item):
         if isinstance(item, Point):
@@ -162,3 +213,67 @@ class Graph(object):
 
     def __repr__(self):
         return self.__str__()
+
+
+class CombinedGraph(object):
+    """
+    Two graphs looked at as one, without copying either of them, for
+    instance an obstacle graph with temporary obstacles in a Graph on top.
+
+    Points and Edges of both graphs are returned by the same lookups as a
+    Graph supports. The polygon IDs of the two graphs must not overlap.
+    The graphs must not change while the CombinedGraph is used, as the
+    union of their edges is only made once.
+    """
+
+    def __init__(self, graph, extra):
+        self.graph = graph
+        self.extra = extra
+        self.polygons = _CombinedPolygons(graph.polygons, extra.polygons)
+        self._edges = None
+
+    def get_adjacent_points(self, point):
+        return [edge.get_adjacent(point) for edge in self[point]]
+
+    def get_points(self):
+        points = self.graph.get_points()
+        points.extend(p for p in self.extra.get_points()
+                      if p not in self.graph)
+        return points
+
+    def get_edges(self):
+        if self._edges is None:
+            self._edges = set(self.graph.get_edges()) | self.extra.get_edges()
+        return self._edges
+
+    def __contains__(self, item):
+        return item in self.graph or item in self.extra
+
+    def __getitem__(self, point):
+        if point in self.extra:
+            return self.graph[point] | self.extra[point]
+        return self.graph[point]
+
+
+class _CombinedPolygons(object):
+
+    def __init__(self, polygons, extra):
+        self.polygons = polygons
+        self.extra = extra
+
+    def __getitem__(self, polygon_id):
+        if polygon_id in self.extra:
+            return self.extra[polygon_id]
+        return self.polygons[polygon_id]
+
+    def __iter__(self):
+        for polygon_id in self.polygons:
+            yield polygon_id
+        for polygon_id in self.extra:
+            yield polygon_id
+
+    def __contains__(self, polygon_id):
+        return polygon_id in self.extra or polygon_id in self.polygons
+
+    def __len__(self):
+        return len(self.polygons) + len(self.extra)
@@ -0,0 +1,170 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016 Christian August Reksten-Monsen
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from array import array
+import mmap
+import struct
+import sys
+
+from pyvisgraph.compact_graph import CompactGraph
+
+PYTHON3 = sys.version_info[0] == 3
+
+MAGIC = b'PVGB'
+VERSION = 1
+
+# Magic, format version and number of sections, followed by one entry per
+# section: name, array typecode, byte offset in the file and item count.
+_HEADER = struct.Struct('<4sII')
+_SECTION = struct.Struct('<8s4sQQ')
+_ALIGN = 8
+
+# The arrays of a CompactGraph stored for each graph, with their typecodes.
+# A typecode in the file stands for the item size struct gives it, 8 bytes
+# for 'q' and 4 bytes for 'i'.
+_FIELDS = [('xs', 'd'), ('ys', 'd'), ('polygon_ids', 'i'), ('offsets', 'q'),
+           ('neighbours', 'i'), ('lengths', 'd'), ('polygon_offsets', 'q'),
+           ('polygon_edges', 'i')]
+_NAMES = {'xs': b'xs', 'ys': b'ys', 'polygon_ids': b'pid', 'offsets': b'off',
+          'neighbours': b'nbr', 'lengths': b'len', 'polygon_offsets': b'poff',
+          'polygon_edges': b'pedg'}
+
+
+def is_graph_file(filename):
+    """Return True if filename is a binary graph file, see save_graphs."""
+    with open(filename, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def save_graphs(filename, graph, visgraph, extra=None):
+    """Save the obstacle graph and visibility graph in the binary format.
+
+    Both graphs are stored as CompactGraph arrays: coordinates, polygon ids,
+    the CSR adjacency, edge lengths (for the visibility graph) and the edges
+    of each polygon (for the obstacle graph). Each array is a section of the
+    file, aligned to 8 bytes and stored little-endian, so load_graphs can
+    map it into memory as it is.
+    extra maps names of up to 6 bytes to more arrays to store, which
+    load_graphs returns with extra=True.
+    """
+    sections = []
+    for name, values in sorted((extra or {}).items()):
+        if sys.byteorder != 'little':
+            values = array(values.typecode, values)
+            values.byteswap()
+        sections.append((b'x.' + name, values.typecode, values))
+    for prefix, g, lengths in ((b'g.', graph, False), (b'v.', visgraph, True)):
+        if not isinstance(g, CompactGraph):
+            g = CompactGraph.from_graph(g, lengths)
+        for field, typecode in _FIELDS:
+            values = getattr(g, field)
+            if values is None:
+                continue
+            local = _array_typecode(typecode)
+            if not isinstance(values, array) or values.typecode != local:
+                values = array(local, values)
+            if sys.byteorder != 'little':
+                values = array(local, values)
+                values.byteswap()
+            sections.append((prefix + _NAMES[field], typecode, values))
+
+    offset = _HEADER.size + _SECTION.size * len(sections)
+    entries = []
+    for name, typecode, values in sections:
+        offset += -offset % _ALIGN
+        entries.append((name, typecode, offset, len(values)))
+        offset += len(values) * values.itemsize
+
+    with open(filename, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(sections)))
+        for name, typecode, offset, count in entries:
+            f.write(_SECTION.pack(name, typecode.encode('ascii'), offset,
+                                  count))
+        for (_, _, offset, _), (_, _, values) in zip(entries, sections):
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(values.tobytes() if PYTHON3 else values.tostring())
+
+
+def load_graphs(filename, extra=False):
+    """Open a binary graph file and return (graph, visgraph).
+
+    Both are CompactGraphs whose arrays are read-only memoryviews of the
+    file mapped into memory, so opening takes about the same time for any
+    size of graph. The operating system reads the pages in as they are
+    used, and shares them between all processes that open the same file.
+    With extra=True, a dict of the extra arrays saved with the graphs is
+    returned as well.
+    On Python 2, and on big-endian machines, the arrays are copied from
+    the file instead, as their memoryviews can not be cast.
+    """
+    with open(filename, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, count = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("{} is not a pyvisgraph graph file".format(filename))
+    if version != VERSION:
+        raise ValueError("{} has graph file version {}, expected {}".format(
+            filename, version, VERSION))
+    sections = {}
+    for k in range(count):
+        name, typecode, offset, length = _SECTION.unpack_from(
+            data, _HEADER.size + k * _SECTION.size)
+        typecode = typecode.rstrip(b'\0').decode('ascii')
+        sections[name.rstrip(b'\0')] = _view(data, typecode, offset, length)
+
+    graphs = []
+    for prefix in (b'g.', b'v.'):
+        fields = dict((field, sections.get(prefix + _NAMES[field]))
+                      for field, _ in _FIELDS)
+        graphs.append(CompactGraph(**fields))
+    if extra:
+        graphs.append(dict((name[2:], values)
+                           for name, values in sections.items()
+                           if name.startswith(b'x.')))
+    return tuple(graphs)
+
+
+def _array_typecode(typecode):
+    """Return the array typecode for the typecode of a graph file section.
+    Python 2 has no 'q' arrays, so its 'l' is used if it has 64 bits."""
+    if typecode != 'q' or PYTHON3:
+        return typecode
+    if array('l').itemsize != struct.calcsize('<q'):
+        raise ValueError("Binary graph files need 64 bit 'l' arrays on "
+                         "Python 2")
+    return 'l'
+
+
+def _view(data, typecode, offset, length):
+    size = struct.calcsize('<' + typecode)
+    if PYTHON3 and sys.byteorder == 'little':
+        return memoryview(data)[offset:offset + length * size].cast(typecode)
+    values = array(_array_typecode(typecode))
+    chunk = data[offset:offset + length * size]
+    if PYTHON3:
+        values.frombytes(chunk)
+    else:
+        values.fromstring(chunk)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
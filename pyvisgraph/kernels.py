@@ -0,0 +1,356 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016 Christian August Reksten-Monsen
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from __future__ import division
+from math import atan, pi
+
+from pyvisgraph.graph import CombinedGraph
+from pyvisgraph.compact_graph import CompactGraph
+from pyvisgraph.constants import INF, T, T2
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# NumPy versions of the geometric functions in visible_vertices, which
+# evaluate them over arrays of coordinates at once. They give exactly the
+# same results as the scalar functions, including the truncation ccw applies
+# to decide collinearity.
+
+# Bound on the difference between angles from NumPy's arctan and math.atan
+ANGLE_TOLERANCE = 1e-12
+
+
+def ccw(ax, ay, bx, by, cx, cy):
+    """Return 1 where counter clockwise, -1 where clock wise and 0 where
+    collinear, like visible_vertices.ccw."""
+    area = np.trunc(((bx - ax) * (cy - ay) - (by - ay) * (cx - ax)) * T) / T2
+    return np.sign(area).astype(np.int8)
+
+
+def on_segment(px, py, qx, qy, rx, ry):
+    """Return True where q lies on the segment pr, given p, q, r collinear,
+    like visible_vertices.on_segment."""
+    return ((qx <= np.maximum(px, rx)) & (qx >= np.minimum(px, rx)) &
+            (qy <= np.maximum(py, ry)) & (qy >= np.minimum(py, ry)))
+
+
+def edge_intersect(p1x, p1y, q1x, q1y, p2x, p2y, q2x, q2y):
+    """Return True where the segment p1q1 intersects the segment p2q2, like
+    visible_vertices.edge_intersect."""
+    o1 = ccw(p1x, p1y, q1x, q1y, p2x, p2y)
+    o2 = ccw(p1x, p1y, q1x, q1y, q2x, q2y)
+    o3 = ccw(p2x, p2y, q2x, q2y, p1x, p1y)
+    o4 = ccw(p2x, p2y, q2x, q2y, q1x, q1y)
+    return (((o1 != o2) & (o3 != o4)) |
+            ((o1 == 0) & on_segment(p1x, p1y, p2x, p2y, q1x, q1y)) |
+            ((o2 == 0) & on_segment(p1x, p1y, q2x, q2y, q1x, q1y)) |
+            ((o3 == 0) & on_segment(p2x, p2y, p1x, p1y, q2x, q2y)) |
+            ((o4 == 0) & on_segment(p2x, p2y, q1x, q1y, q2x, q2y)))
+
+
+def angle(cx, cy, px, py):
+    """Return the angle (radian) of the points p from the points c, like
+    visible_vertices.angle.
+
+    NumPy's arctan may differ from math.atan in the last bit, which would
+    change the order of points at nearly the same angle, so the arc tangents
+    are taken with math.atan.
+    """
+    dx = np.asarray(px - cx, dtype=float)
+    dy = np.asarray(py - cy, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = (dy / dx).ravel()
+    arc = np.fromiter(map(atan, ratio.tolist()), float,
+                      len(ratio)).reshape(dx.shape)
+    return _piecewise_angle(dx, dy, arc)
+
+
+def _square(x):
+    # x**2 in Python calls the C library's pow, which is not always exactly
+    # x * x like NumPy's x**2 is, but is what float_power calls.
+    return np.float_power(x, 2)
+
+
+def edge_distance(x1, y1, x2, y2):
+    """Return the Euclidean distance between the points (x1, y1) and
+    (x2, y2), like visible_vertices.edge_distance."""
+    return np.sqrt(_square(x2 - x1) + _square(y2 - y1))
+
+
+def crossings(px, py, e1x, e1y, e2x, e2y):
+    """Return True where the edge e1e2 counts as a crossing of the ray from
+    p to the right in visible_vertices.polygon_crossing."""
+    rx = np.full_like(px, INF)
+    skip = (((py < e1y) & (py < e2y)) | ((py > e1y) & (py > e2y)) |
+            ((px > e1x) & (px > e2x)))
+    c1 = ccw(px, py, e1x, e1y, rx, py) == 0
+    c2 = ccw(px, py, e2x, e2y, rx, py) == 0
+    # With one end point on the ray, the edge counts if it goes up from it
+    other_y = np.where(c1, e2y, e1y)
+    one = (c1 != c2) & (other_y > py)
+    neither = ~c1 & ~c2 & edge_intersect(px, py, rx, py, e1x, e1y, e2x, e2y)
+    return ~skip & (one | neither)
+
+
+def point_arrays(graph):
+    """Return a function from i to the i-th Point of graph, as from
+    get_points, and arrays of the x and y coordinates of the Points.
+
+    For a CompactGraph the arrays are views of its coordinate arrays, and
+    the Points are created as they are asked for. For a Graph they are made
+    on first use and kept on graph, which drops them when its edges change.
+    """
+    if isinstance(graph, CompactGraph):
+        return (graph.point, np.frombuffer(graph.xs, float),
+                np.frombuffer(graph.ys, float))
+    arrays = getattr(graph, '_point_arrays', None)
+    if arrays is None:
+        points = graph.get_points()
+        arrays = (points.__getitem__,
+                  np.fromiter((p.x for p in points), float, len(points)),
+                  np.fromiter((p.y for p in points), float, len(points)))
+        if not isinstance(graph, CombinedGraph):
+            graph._point_arrays = arrays
+    return arrays
+
+
+def _piecewise_angle(dx, dy, arc):
+    """The angle of visible_vertices.angle, given arc = atan(dy / dx)."""
+    result = np.where(dx < 0, pi + arc, np.where(dy < 0, 2 * pi + arc, arc))
+    result = np.where(dy == 0, np.where(dx < 0, pi, 0.0), result)
+    return np.where(dx == 0, np.where(dy < 0, pi * 3 / 2, pi / 2), result)
+
+
+def angular_order(point, xs, ys, half=False):
+    """Return the indices of the points (xs[i], ys[i]) sorted by angle
+    from point, then by distance, with ties in their order in xs, like a
+    stable sort with the key (angle(point, p), edge_distance(point, p)).
+    With half, only the points at angles up to pi are returned.
+
+    The points are sorted by angles from NumPy's arctan, which are at most a
+    few bits off. Runs of points with angles closer than ANGLE_TOLERANCE,
+    which include all ties, may be in the wrong order, and are sorted again
+    with the exact keys and then their index.
+    """
+    dx = xs - point.x
+    dy = ys - point.y
+    with np.errstate(divide='ignore', invalid='ignore'):
+        approximate = _piecewise_angle(dx, dy, np.arctan(dy / dx))
+    order = np.argsort(approximate)
+    angles = approximate[order]
+    close = np.diff(angles) <= ANGLE_TOLERANCE
+    if close.any():
+        # Number the runs of close angles, and sort each run on its own
+        run = np.cumsum(np.r_[True, ~close])
+        sizes = np.bincount(run)
+        positions = np.flatnonzero(sizes[run] > 1)
+        members = order[positions]
+        exact = angle(point.x, point.y, xs[members], ys[members])
+        distances = edge_distance(point.x, point.y, xs[members],
+                                  ys[members])
+        order[positions] = members[np.lexsort(
+            (members, distances, exact, run[positions]))]
+    if half:
+        low = np.searchsorted(angles, pi - ANGLE_TOLERANCE, side='left')
+        high = np.searchsorted(angles, pi + ANGLE_TOLERANCE, side='right')
+        middle = order[low:high]
+        exact = angle(point.x, point.y, xs[middle], ys[middle])
+        order = order[:low + np.searchsorted(exact, pi, side='right')]
+    return order
+
+
+def _csr_pairs(rows, starts, ends):
+    """For each i, pair rows[i] with every value in starts[i]:ends[i].
+    Returns the arrays of rows and values."""
+    counts = ends - starts
+    pair_rows = np.repeat(rows, counts)
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    values = np.repeat(starts, counts) + np.arange(counts.sum()) - first
+    return pair_rows, values
+
+
+def _index_arrays(index):
+    """Return the arrays of a spatial.PolygonIndex as NumPy arrays, kept on
+    the index after the first call."""
+    arrays = getattr(index, '_arrays', None)
+    if arrays is None:
+        cells = sorted(index.cells)
+        members = [k for cell in cells for k in index.cells[cell]]
+        offsets = np.cumsum([0] + [len(index.cells[c]) for c in cells])
+        arrays = index._arrays = {
+            'ids': np.array(index.ids + [-1], dtype=np.int64),
+            'boxes': np.frombuffer(index.boxes, dtype=float).reshape(-1, 4),
+            'edges': np.frombuffer(index.edges, dtype=float).reshape(-1, 4),
+            'first_edge': np.append(
+                np.frombuffer(index.first_edge, dtype=np.int32),
+                len(index.edges) // 4),
+            'band_bottom': np.frombuffer(index.band_bottom, dtype=float),
+            'band_height': np.frombuffer(index.band_height, dtype=float),
+            'first_band': np.frombuffer(index.first_band, dtype=np.int32),
+            'band_offsets': np.frombuffer(index.band_offsets, dtype=np.int32),
+            'band_edges': np.frombuffer(index.band_edges, dtype=np.int32),
+            'cells': np.array(cells, dtype=np.int64),
+            'cell_offsets': offsets.astype(np.int64),
+            'cell_members': np.array(members, dtype=np.int64)}
+    return arrays
+
+
+def _cell(values, start, size, count):
+    return np.clip((values - start) / size, 0, count - 1).astype(np.int64)
+
+
+def points_in_polygons(index, x, y):
+    """Return the polygon ID of each point (x[i], y[i]), -1 for points not
+    in any polygon of the spatial.PolygonIndex index. The result is the same
+    as visible_vertices.point_in_polygon for each point."""
+    a = _index_arrays(index)
+    count = len(index.ids)
+    result = np.full(len(x), count, dtype=np.int64)
+    inside = ((x >= index.min_x) & (y >= index.min_y) &
+              (x <= index.min_x + index.columns * index.cell_size) &
+              (y <= index.min_y + index.rows * index.cell_size))
+    points = np.flatnonzero(inside)
+    if not count or not len(points):
+        return a['ids'][result]
+
+    # Pair each point with the polygons in its grid cell, and keep the
+    # pairs where the point is in the bounding box of the polygon.
+    cell = (_cell(x[points], index.min_x, index.cell_size, index.columns) *
+            index.rows +
+            _cell(y[points], index.min_y, index.cell_size, index.rows))
+    k = np.minimum(np.searchsorted(a['cells'], cell), len(a['cells']) - 1)
+    found = a['cells'][k] == cell
+    points = points[found]
+    k = k[found]
+    points, member = _csr_pairs(points, a['cell_offsets'][k],
+                                a['cell_offsets'][k + 1])
+    polygons = a['cell_members'][member]
+    boxes = a['boxes'][polygons]
+    px = x[points]
+    py = y[points]
+    keep = ((boxes[:, 0] <= px) & (px <= boxes[:, 2]) &
+            (boxes[:, 1] <= py) & (py <= boxes[:, 3]))
+    points = points[keep]
+    polygons = polygons[keep]
+    py = py[keep]
+
+    # Pair each of those with the edges in the band of the point, and count
+    # the crossings per pair.
+    bands = a['first_band'][polygons + 1] - a['first_band'][polygons]
+    band = a['first_band'][polygons] + np.clip(
+        (py - a['band_bottom'][polygons]) / a['band_height'][polygons],
+        0, bands - 1).astype(np.int64)
+    pairs, member = _csr_pairs(np.arange(len(points)),
+                               a['band_offsets'][band],
+                               a['band_offsets'][band + 1])
+    edges = a['edges'][a['band_edges'][member]]
+    counts = np.bincount(pairs, crossings(
+        x[points[pairs]], y[points[pairs]], edges[:, 0], edges[:, 1],
+        edges[:, 2], edges[:, 3]), minlength=len(points))
+    odd = (counts.astype(np.int64) % 2) == 1
+    # The first polygon, in index order, holding the point wins
+    np.minimum.at(result, points[odd], polygons[odd])
+    return a['ids'][result]
+
+
+def _tree_arrays(tree):
+    """Return the arrays of a spatial.EdgeTree as NumPy arrays, kept on the
+    tree after the first call."""
+    arrays = getattr(tree, '_arrays', None)
+    if arrays is None:
+        first = np.frombuffer(tree.first, dtype=np.int32)
+        arrays = tree._arrays = {
+            'boxes': np.frombuffer(tree.boxes, dtype=float).reshape(-1, 4),
+            'first': first,
+            'end': first + np.frombuffer(tree.count, dtype=np.int32),
+            'leaf': np.frombuffer(tree.leaf, dtype=np.int8).astype(bool),
+            'entries': np.frombuffer(tree.entries, dtype=np.int32),
+            'roots': np.frombuffer(tree.roots, dtype=np.int32)}
+    return arrays
+
+
+def closest_points(index, x, y, polygon_ids):
+    """Return the closest point on the boundary of polygon polygon_ids[i]
+    to each point (x[i], y[i]), as the arrays (x, y, vertex), where vertex
+    is True if the point is an end point of the polygon edge it is on. Ties
+    go to the first edge, like in visible_vertices.closest_point.
+    polygon_ids must all be in index.
+
+    The edge trees of the polygons are searched for all points at once, a
+    level at a time, dropping the nodes farther from a point than the far
+    side of a box already seen.
+    """
+    a = _index_arrays(index)
+    t = _tree_arrays(index.tree())
+    k = np.array([index.positions[i] for i in polygon_ids], dtype=np.int64)
+    bound = np.full(len(x), np.inf)
+    rows = np.arange(len(x))
+    nodes = t['roots'][k]
+    found_rows = []
+    found_edges = []
+    while len(nodes):
+        boxes = t['boxes'][nodes]
+        px = x[rows]
+        py = y[rows]
+        near = np.hypot(
+            np.maximum(np.maximum(boxes[:, 0] - px, px - boxes[:, 2]), 0),
+            np.maximum(np.maximum(boxes[:, 1] - py, py - boxes[:, 3]), 0))
+        far = np.hypot(np.maximum(px - boxes[:, 0], boxes[:, 2] - px),
+                       np.maximum(py - boxes[:, 1], boxes[:, 3] - py))
+        np.minimum.at(bound, rows, far)
+        keep = near <= bound[rows]
+        rows = rows[keep]
+        nodes = nodes[keep]
+        leaf = t['leaf'][nodes]
+        found, member = _csr_pairs(rows[leaf], t['first'][nodes[leaf]],
+                                   t['end'][nodes[leaf]])
+        found_rows.append(found)
+        found_edges.append(t['entries'][member])
+        inner = nodes[~leaf]
+        rows, nodes = _csr_pairs(rows[~leaf], t['first'][inner],
+                                 t['end'][inner])
+
+    rows = np.concatenate(found_rows)
+    e = np.concatenate(found_edges)
+    edges = a['edges'][e]
+    px = x[rows]
+    py = y[rows]
+    e1x, e1y, e2x, e2y = edges[:, 0], edges[:, 1], edges[:, 2], edges[:, 3]
+    num = (px - e1x) * (e2x - e1x) + (py - e1y) * (e2y - e1y)
+    denom = _square(e2x - e1x) + _square(e2y - e1y)
+    u = num / denom
+    cx = np.where(u < 0, e1x, np.where(u > 1, e2x, e1x + u * (e2x - e1x)))
+    cy = np.where(u < 0, e1y, np.where(u > 1, e2y, e1y + u * (e2y - e1y)))
+    d = edge_distance(px, py, cx, cy)
+    # The first smallest distance of each point: sort by point, distance
+    # and edge, and take the first of each point.
+    order = np.lexsort((e, d, rows))
+    first = order[np.r_[True, rows[order][1:] != rows[order][:-1]]]
+    cx = cx[first]
+    cy = cy[first]
+    edges = edges[first]
+    vertex = (((cx == edges[:, 0]) & (cy == edges[:, 1])) |
+              ((cx == edges[:, 2]) & (cy == edges[:, 3])))
+    return cx, cy, vertex
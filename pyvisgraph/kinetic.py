@@ -0,0 +1,199 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016 Christian August Reksten-Monsen
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from __future__ import division
+from heapq import heapify, heappush, heappop
+from math import atan2
+
+from pyvisgraph.graph import Edge
+from pyvisgraph.spatial import SegmentGrid
+
+from pyvisgraph.visible_vertices import visible_vertices, initial_open_edges
+from pyvisgraph.visible_vertices import edge_intersect, edge_in_polygon
+from pyvisgraph.visible_vertices import on_segment, ccw, OpenEdges
+from pyvisgraph.visible_vertices import INF, CCW, COLLINEAR
+
+"""Events of a point closer in direction than this are handled by a
+   visibility scan instead, see kinetic_vis_graph."""
+ANGLE_TOLERANCE = 1e-9
+
+
+def kinetic_vis_graph(graph, backend='list'):
+    """Return the visibility edges of graph that the half visibility scans
+    (see visible_vertices) from all its Points find, as a list of Edges.
+
+    Instead of a scan with its own open edges from every Point, one
+    direction is turned from 0 to pi for all Points at once. The Points are
+    kept sorted across the direction, and two neighbours swap places when
+    the direction passes the line through them (kinetic sorting), so every
+    pair of Points comes up once, in order of direction, with the next
+    swaps of neighbours in a heap. Each Point only keeps the first edge its
+    ray in the current direction hits, as the scan would find it in its
+    open edges: when the ray of p passes a visible q, the first edge hit
+    beyond q is an edge of q or the one the ray of q hits in the same
+    direction. The work per pair is constant, without the ordered open
+    edges of the scans.
+
+    Points where the result could differ from a scan, because another Point
+    is at the same height, Points are collinear within tolerance, or they
+    take over the ray of such a Point, are scanned with visible_vertices
+    using backend instead. The first edge hit is only well defined if no
+    obstacle edges cross each other, so if any do, e.g. in a
+    self-intersecting polygon, all Points are scanned. The edges are the
+    same as those the scans find.
+    """
+    points = graph.get_points()
+    n = len(points)
+    xs = [p.x for p in points]
+    ys = [p.y for p in points]
+    index = dict((p, i) for i, p in enumerate(points))
+    # The obstacle edges of each Point, with the index of the other end.
+    adjacent = [[(e, index[e.get_adjacent(p)]) for e in graph[p]]
+                for p in points]
+    order = sorted(range(n), key=lambda i: (ys[i], xs[i]))
+    position = [0] * n
+    for k, i in enumerate(order):
+        position[i] = k
+    scan = [False] * n
+    # The ray from a Point at the height of another passes through it.
+    for i, j in zip(order, order[1:]):
+        if ys[i] == ys[j]:
+            scan[i] = scan[j] = True
+    # The scans leave out edges beyond x = INF, see initial_open_edges.
+    if any(x > INF - 1 for x in xs) or _edges_cross(graph.get_edges()):
+        scan = [True] * n
+
+    # hit holds the first edge hit by the ray of each Point, and hit_ends
+    # the indices of its Points.
+    hit = [None] * n
+    hit_ends = [()] * n
+    for i, p in enumerate(points):
+        if not scan[i]:
+            open_edges = initial_open_edges(p, graph)
+            if len(open_edges):
+                edge = open_edges.smallest()
+                hit[i] = edge
+                hit_ends[i] = (index[edge.p1], index[edge.p2])
+
+    def swap_event(k):
+        i = order[k]
+        j = order[k + 1]
+        dy = ys[j] - ys[i]
+        if dy > 0 or (dy == 0 and xs[i] < xs[j]):
+            return (atan2(dy, xs[j] - xs[i]), i, j)
+        return None
+
+    heap = [e for e in (swap_event(k) for k in range(n - 1)) if e]
+    heapify(heap)
+    less_than = OpenEdges()._less_than
+    last = [None] * n
+    last_angle = [-1.0] * n
+    visible_edges = []
+    while heap:
+        theta, i, j = heappop(heap)
+        k = position[i]
+        if position[j] != k + 1:
+            continue
+        order[k] = j
+        order[k + 1] = i
+        position[i] = k + 1
+        position[j] = k
+        if k > 0:
+            event = swap_event(k - 1)
+            if event:
+                heappush(heap, event)
+        if k + 2 < n:
+            event = swap_event(k + 1)
+            if event:
+                heappush(heap, event)
+        if scan[i]:
+            continue
+
+        # The ray from p has turned to q. Collinear Points are handled in
+        # the scans, as are edges on the ray.
+        p = points[i]
+        q = points[j]
+        prev = last[i]
+        if theta - last_angle[i] < ANGLE_TOLERANCE or (
+                prev is not None and ccw(p, prev, q) == COLLINEAR and
+                on_segment(p, prev, q)):
+            scan[i] = True
+            continue
+        last[i] = q
+        last_angle[i] = theta
+        edge = hit[i]
+        if (edge is not None and j not in hit_ends[i] and
+                edge_intersect(p, q, edge)):
+            # q is behind the first edge, which stays the first edge
+            if ccw(edge.p1, edge.p2, q) == COLLINEAR:
+                scan[i] = True
+            continue
+
+        nearest = None
+        for e, r in adjacent[j]:
+            if r == i:
+                continue
+            turn = ccw(p, q, points[r])
+            if turn == COLLINEAR:
+                scan[i] = True
+                break
+            if turn == CCW and (nearest is None or
+                                less_than(p, q, e, nearest)):
+                nearest = e
+                nearest_ends = (j, r)
+        if scan[i]:
+            continue
+        if (any(r == i for _, r in adjacent[j]) or
+                not edge_in_polygon(p, q, graph)):
+            visible_edges.append((i, j))
+        if nearest is not None:
+            hit[i] = nearest
+            hit_ends[i] = nearest_ends
+        else:
+            hit[i] = hit[j]
+            hit_ends[i] = hit_ends[j]
+            scan[i] = scan[j]
+
+    edges = [Edge(points[i], points[j]) for i, j in visible_edges
+             if not scan[i]]
+    for i, p in enumerate(points):
+        if scan[i]:
+            for v in visible_vertices(p, graph, scan='half', backend=backend):
+                edges.append(Edge(p, v))
+    return edges
+
+
+def _edges_cross(edges):
+    """Return True if two of edges that do not share an end point
+    intersect, as edge_intersect decides."""
+    edges = list(edges)
+    grid = SegmentGrid([(e.p1.x, e.p1.y, e.p2.x, e.p2.y) for e in edges])
+    for k, e in enumerate(edges):
+        box = (min(e.p1.x, e.p2.x), min(e.p1.y, e.p2.y),
+               max(e.p1.x, e.p2.x), max(e.p1.y, e.p2.y))
+        for m in grid.query(box):
+            f = edges[m]
+            if m > k and e.p1 not in f and e.p2 not in f and (
+                    edge_intersect(e.p1, e.p2, f)):
+                return True
+    return False
@@ -21,9 +21,16 @@ LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
+from array import array
+from collections import defaultdict
 from heapq import heapify, heappush, heappop
+from math import sqrt
+from operator import sub
+from pyvisgraph.compact_graph import CompactGraph
 from pyvisgraph.visible_vertices import edge_distance
 
+INF = float('inf')
+
 try:
     dict.iteritems
 except AttributeError:
@@ -36,19 +43,30 @@ else:
         return d.iteritems()
 
 
-def dijkstra(graph, origin, destination, add_to_visgraph):
+def dijkstra(graph, origin, destination, add_to_visgraph, targets=None,
+             remove_from_visgraph=None):
+    """Dijkstra's algorithm from origin. Stops when destination is settled,
+    or when all Points in targets are. Edges in the Graph
+    remove_from_visgraph are not used. Returns the distances D and
+    predecessors P of the settled Points."""
     D = {}
     P = {}
     Q = priority_dict()
     Q[origin] = 0
+    remaining = set(targets) if targets is not None else None
 
     for v in Q:
         D[v] = Q[v]
         if v == destination: break
+        if remaining is not None:
+            remaining.discard(v)
+            if not remaining: break
 
         edges = graph[v]
         if add_to_visgraph != None and len(add_to_visgraph[v]) > 0:
             edges = add_to_visgraph[v] | graph[v]
+        if remove_from_visgraph != None and v in remove_from_visgraph:
+            edges = edges - remove_from_visgraph[v]
         for e in edges:
             w = e.get_adjacent(v)
             elength = D[v] + edge_distance(v, w)
@@ -61,8 +79,58 @@ def dijkstra(graph, origin, destination, add_to_visgraph):
     return (D, P)
 
 
-def shortest_path(graph, origin, destination, add_to_visgraph=None):
-    D, P = dijkstra(graph, origin, destination, add_to_visgraph)
+def astar(graph, origin, destination, add_to_visgraph,
+          remove_from_visgraph=None, heuristic=None):
+    """A* search from origin to destination, with the Euclidean distance to
+    destination as heuristic. No path in a visibility graph can be shorter
+    than the straight line, so the heuristic is admissible and consistent
+    and the path found is a shortest path. Another consistent heuristic,
+    a function from Point to a lower bound of its distance to destination,
+    can be given instead, see landmark_heuristic. Returns (D, P) like
+    dijkstra, but D only holds the Points the search had to settle."""
+    if heuristic is None:
+        heuristic = lambda v: edge_distance(v, destination)
+    D = {}
+    P = {}
+    G = {origin: 0}
+    Q = [(heuristic(origin), origin)]
+    while Q:
+        _, v = heappop(Q)
+        if v in D:
+            continue
+        D[v] = G[v]
+        if v == destination: break
+
+        edges = graph[v]
+        if add_to_visgraph != None and len(add_to_visgraph[v]) > 0:
+            edges = add_to_visgraph[v] | graph[v]
+        if remove_from_visgraph != None and v in remove_from_visgraph:
+            edges = edges - remove_from_visgraph[v]
+        for e in edges:
+            w = e.get_adjacent(v)
+            if w in D:
+                continue
+            elength = D[v] + edge_distance(v, w)
+            if w not in G or elength < G[w]:
+                G[w] = elength
+                P[w] = v
+                heappush(Q, (elength + heuristic(w), w))
+    return (D, P)
+
+
+SEARCH_ALGORITHMS = {
+    'dijkstra': dijkstra,
+    'astar': astar,
+}
+
+
+def shortest_path(graph, origin, destination, add_to_visgraph=None,
+                  algorithm='dijkstra', remove_from_visgraph=None,
+                  heuristic=None):
+    search = SEARCH_ALGORITHMS[algorithm]
+    kwargs = {'heuristic': heuristic} if heuristic is not None else {}
+    D, P = search(graph, origin, destination, add_to_visgraph,
+                  remove_from_visgraph=remove_from_visgraph, **kwargs)
     path = []
     while 1:
         path.append(destination)
@@ -72,6 +140,326 @@ def shortest_path(graph, origin, destination, add_to_visgraph=None):
     return path
 
 
+class Overlay(object):
+    """Temporary vertices and edges on top of a CompactGraph.
+
+    Points that are not in the CompactGraph, like the origin and destination
+    of a query, get vertex ids from len(graph) and up. The temporary edges
+    are kept here, by vertex id and with their length, and so are the edges
+    of the CompactGraph that are temporarily removed, so the CompactGraph
+    itself is never changed.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.points = []
+        # Vertex ids of the points, by their (x, y)
+        self.ids = {}
+        self.edges = defaultdict(list)
+        self.removed = defaultdict(set)
+
+    def find(self, point):
+        """Return the vertex id of point, -1 if it is not known."""
+        i = self.graph.vertex_id(point)
+        if i != -1:
+            return i
+        return self.ids.get((point.x, point.y), -1)
+
+    def vertex_id(self, point):
+        """Return the vertex id of point, adding it if it is new."""
+        i = self.find(point)
+        if i != -1:
+            return i
+        i = self.ids[point.x, point.y] = len(self.graph) + len(self.points)
+        self.points.append(point)
+        return i
+
+    def point(self, i):
+        if i < len(self.graph):
+            return self.graph.point(i)
+        return self.points[i - len(self.graph)]
+
+    def add_edge(self, edge):
+        i = self.vertex_id(edge.p1)
+        j = self.vertex_id(edge.p2)
+        length = edge_distance(edge.p1, edge.p2)
+        self.edges[i].append((j, length))
+        self.edges[j].append((i, length))
+
+    def remove_edge(self, edge):
+        i = self.vertex_id(edge.p1)
+        j = self.vertex_id(edge.p2)
+        self.removed[i].add(j)
+        self.removed[j].add(i)
+
+
+def compact_dijkstra(graph, origin, destination, overlay=None,
+                     heuristic=None, targets=None):
+    """Dijkstra's algorithm over the vertex ids of a CompactGraph.
+
+    Works like dijkstra, but on integer vertex ids and the precomputed edge
+    lengths of graph, using a plain binary heap. Temporary edges are taken
+    from overlay, and edges removed in overlay are skipped. If heuristic is
+    given, it must be a function returning a consistent lower bound of the
+    distance from a vertex id to destination, and the search becomes A*.
+    Like dijkstra, the search can instead stop when all vertex ids in
+    targets are settled. Returns the dicts (D, P) keyed by vertex id.
+    """
+    n = len(graph)
+    offsets = graph.offsets
+    neighbours = graph.neighbours
+    lengths = graph.lengths
+    extra = overlay.edges if overlay is not None else {}
+    removed = overlay.removed if overlay is not None else {}
+    D = {}
+    P = {}
+    Q = {origin: 0.0}
+    heap = [(0.0, origin)]
+    remaining = set(targets) if targets is not None else None
+    while heap:
+        _, v = heappop(heap)
+        if v in D:
+            continue
+        dist = D[v] = Q[v]
+        if v == destination: break
+        if remaining is not None:
+            remaining.discard(v)
+            if not remaining: break
+
+        if v < n:
+            start = offsets[v]
+            end = offsets[v + 1]
+            if lengths is not None:
+                edges = zip(neighbours[start:end], lengths[start:end])
+            else:
+                edges = [(w, graph.edge_length(v, w))
+                         for w in neighbours[start:end]]
+        else:
+            edges = ()
+        blocked = removed.get(v, ())
+        for adjacent in (edges, extra.get(v, ())):
+            for w, length in adjacent:
+                if w in D or w in blocked:
+                    continue
+                elength = dist + length
+                if elength < Q.get(w, INF):
+                    Q[w] = elength
+                    P[w] = v
+                    if heuristic is not None:
+                        heappush(heap, (elength + heuristic(w), w))
+                    else:
+                        heappush(heap, (elength, w))
+    return (D, P)
+
+
+def euclidean_heuristic(overlay, destination):
+    """Return the A* heuristic for compact_dijkstra: the straight line
+    distance from a vertex id in overlay to the Point destination."""
+    graph = overlay.graph
+    n = len(graph)
+    xs = graph.xs
+    ys = graph.ys
+    dx = destination.x
+    dy = destination.y
+
+    def heuristic(v):
+        if v < n:
+            return sqrt((dx - xs[v])**2 + (dy - ys[v])**2)
+        return edge_distance(overlay.point(v), destination)
+    return heuristic
+
+
+def compact_shortest_path(graph, origin, destination, overlay=None,
+                          algorithm='dijkstra', heuristic=None):
+    """Return the shortest path between the Points origin and destination
+    in the CompactGraph graph, with temporary edges from overlay.
+    algorithm is 'dijkstra' or 'astar'. A* uses heuristic, a function of
+    the vertex ids of overlay, or else euclidean_heuristic."""
+    if algorithm not in SEARCH_ALGORITHMS:
+        raise KeyError(algorithm)
+    if overlay is None:
+        overlay = Overlay(graph)
+    origin_id = overlay.vertex_id(origin)
+    destination_id = overlay.vertex_id(destination)
+    if algorithm != 'astar':
+        heuristic = None
+    elif heuristic is None:
+        heuristic = euclidean_heuristic(overlay, destination)
+    D, P = compact_dijkstra(graph, origin_id, destination_id, overlay,
+                            heuristic)
+    path = []
+    v = destination_id
+    while 1:
+        path.append(overlay.point(v))
+        if v == origin_id: break
+        v = P[v]
+    path.reverse()
+    return path
+
+
+class Landmarks(object):
+    """Shortest path distances from a few landmark vertices of a visibility
+    graph to all of its vertices, for the A* heuristic of landmark_heuristic.
+
+    The vertices are numbered like the vertex ids of a CompactGraph of the
+    visibility graph, in (x, y) order. ids holds the numbers of the k
+    landmarks, and distances[i * k + j] the distance from landmark j to
+    vertex i, inf if there is no path, so the k distances of a vertex are
+    next to each other. version is the version of the visibility graph
+    they are for, and index can hold a dict from Point to vertex number.
+    """
+
+    def __init__(self, ids, distances, version=0):
+        self.ids = ids
+        self.distances = distances
+        self.version = version
+        self.index = None
+
+    def row(self, i):
+        """Return the distances from the landmarks to vertex number i."""
+        k = len(self.ids)
+        return self.distances[i * k:(i + 1) * k]
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def compute_landmarks(graph, k, version=0):
+    """Return Landmarks for k vertices of the CompactGraph graph.
+
+    The landmarks are chosen by farthest selection: the first is the vertex
+    farthest from vertex 0, and each next one the vertex farthest from the
+    landmarks chosen so far. Vertices without a path to those count as
+    farthest, so each connected part of graph gets a landmark if k allows.
+    """
+    n = len(graph)
+    ids = array('i')
+    rows = []
+    if n == 0:
+        return Landmarks(ids, array('d'), version)
+    D, _ = compact_dijkstra(graph, 0, None)
+    nearest = [D.get(i, INF) for i in range(n)]
+    v = max(range(n), key=nearest.__getitem__)
+    nearest = [INF] * n
+    for _ in range(min(k, n)):
+        D, _ = compact_dijkstra(graph, v, None)
+        row = [D.get(i, INF) for i in range(n)]
+        ids.append(v)
+        rows.append(row)
+        nearest = list(map(min, nearest, row))
+        v = max(range(n), key=nearest.__getitem__)
+        if nearest[v] == 0:
+            break
+    distances = array('d', (row[i] for i in range(n) for row in rows))
+    return Landmarks(ids, distances, version)
+
+
+def landmark_heuristic(target, row, euclidean, symmetric=True):
+    """Return a consistent A* heuristic from landmark distances (ALT).
+
+    target holds the distances from the landmarks to the destination, and
+    row(v) those to v, or None if v has none. By the triangle inequality,
+    the distance from v to the destination is at least the difference of
+    their distances to each landmark. The heuristic is the largest of those
+    bounds and euclidean(v), which is much tighter than the straight line
+    alone where the paths go around large obstacles. With symmetric=False,
+    only the bounds target - row(v) are used.
+    """
+    active = [j for j, t in enumerate(target) if t < INF]
+    if not active:
+        return euclidean
+    if len(active) == len(target):
+        active = None
+    else:
+        target = [target[j] for j in active]
+
+    def heuristic(v):
+        h = euclidean(v)
+        distances = row(v)
+        if distances is None:
+            return h
+        if active is not None:
+            distances = [distances[j] for j in active]
+        if symmetric:
+            bound = max(map(abs, map(sub, distances, target)))
+        else:
+            bound = max(map(sub, target, distances))
+        return bound if bound > h else h
+    return heuristic
+
+
+def shortest_path_tree(graph, origin, destinations=None,
+                       add_to_visgraph=None):
+    """Return the ShortestPathTree from origin to the Points in destinations,
+    or to all Points that can be reached if destinations is None. graph is a
+    Graph with temporary edges in the Graph add_to_visgraph, or a CompactGraph
+    with temporary edges in the Overlay add_to_visgraph."""
+    if not isinstance(graph, CompactGraph):
+        D, P = dijkstra(graph, origin, None, add_to_visgraph, destinations)
+        return ShortestPathTree(origin, D, P, destinations=destinations)
+    overlay = add_to_visgraph
+    if overlay is None:
+        overlay = Overlay(graph)
+    targets = None
+    if destinations is not None:
+        targets = [overlay.vertex_id(d) for d in destinations]
+    D, P = compact_dijkstra(graph, overlay.vertex_id(origin), None, overlay,
+                            targets=targets)
+    return ShortestPathTree(origin, D, P, overlay, destinations)
+
+
+class ShortestPathTree(object):
+    """Shortest paths from origin found by a single search.
+
+    distances holds the distance from origin to each Point reached by the
+    search, or only to the requested destinations if these were given.
+    Paths are only put together when asked for with path.
+    """
+
+    def __init__(self, origin, D, P, overlay=None, destinations=None):
+        self.origin = origin
+        self._D = D
+        self._P = P
+        self._overlay = overlay
+        if destinations is None:
+            destinations = [self._point(v) for v in D]
+        self.distances = {}
+        for point in destinations:
+            if point in self:
+                self.distances[point] = self.distance(point)
+
+    def _id(self, point):
+        if self._overlay is None:
+            return point
+        return self._overlay.find(point)
+
+    def _point(self, v):
+        if self._overlay is None:
+            return v
+        return self._overlay.point(v)
+
+    def distance(self, point):
+        """Return the length of the shortest path from origin to point."""
+        return self._D[self._id(point)]
+
+    def path(self, point):
+        """Return the in-order list of Points of the shortest path from
+        origin to point."""
+        v = self._id(point)
+        if v not in self._D:
+            raise KeyError(point)
+        path = [point]
+        while v in self._P:
+            v = self._P[v]
+            path.append(self._point(v))
+        path[-1] = self.origin
+        path.reverse()
+        return path
+
+    def __contains__(self, point):
+        return self._id(point) in self._D
+
+
 class priority_dict(dict):
     """Dictionary that can be used as a priority queue.
 
@@ -0,0 +1,592 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2016 Christian August Reksten-Monsen
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+from __future__ import division
+from array import array
+from heapq import heappush, heappop
+from math import sqrt, ceil
+
+from pyvisgraph.graph import Point, Edge, CombinedGraph
+from pyvisgraph.compact_graph import CompactGraph
+
+
+class SegmentGrid(object):
+    """
+    A uniform grid over line segments, to find the segments near a box
+    without looking at all of them.
+
+    Each segment is stored in every grid cell it passes through. The cell
+    size is a quarter of the mean segment length, so a segment is stored
+    in about five cells, but there are no more than 1024 cells along a side
+    of the bounding box of the segments. query returns the indices of the
+    segments in the cells overlapping a box, which include all segments
+    intersecting it.
+    """
+
+    MAX_CELLS = 1024
+
+    def __init__(self, segments):
+        """segments is a sequence of (x1, y1, x2, y2) tuples."""
+        xs = [x for s in segments for x in (s[0], s[2])]
+        ys = [y for s in segments for y in (s[1], s[3])]
+        self.cells = {}
+        if not segments:
+            self.min_x = self.min_y = 0.0
+            self.cell_size = 1.0
+            self.columns = self.rows = 1
+            return
+        self.min_x = min(xs)
+        self.min_y = min(ys)
+        width = max(xs) - self.min_x
+        height = max(ys) - self.min_y
+        mean_length = sum(sqrt((s[2] - s[0])**2 + (s[3] - s[1])**2)
+                          for s in segments) / len(segments)
+        self.cell_size = max(mean_length / 4, width / self.MAX_CELLS,
+                             height / self.MAX_CELLS) or 1.0
+        self.columns = int(width / self.cell_size) + 1
+        self.rows = int(height / self.cell_size) + 1
+        for k, segment in enumerate(segments):
+            for cell in self._segment_cells(*segment):
+                if cell not in self.cells:
+                    self.cells[cell] = array('i')
+                self.cells[cell].append(k)
+
+    def _column(self, x):
+        return min(max(int((x - self.min_x) / self.cell_size), 0),
+                   self.columns - 1)
+
+    def _row(self, y):
+        return min(max(int((y - self.min_y) / self.cell_size), 0),
+                   self.rows - 1)
+
+    def _segment_cells(self, x1, y1, x2, y2):
+        """Yield the cells the segment passes through, column by column."""
+        if x1 > x2:
+            x1, y1, x2, y2 = x2, y2, x1, y1
+        first = self._column(x1)
+        last = self._column(x2)
+        for column in range(first, last + 1):
+            if first == last:
+                ya, yb = y1, y2
+            else:
+                left = max(x1, self.min_x + column * self.cell_size)
+                right = min(x2, self.min_x + (column + 1) * self.cell_size)
+                slope = (y2 - y1) / (x2 - x1)
+                ya = y1 + (left - x1) * slope
+                yb = y1 + (right - x1) * slope
+            for row in range(self._row(min(ya, yb)),
+                             self._row(max(ya, yb)) + 1):
+                yield column * self.rows + row
+
+    def query(self, box):
+        """Return the set of indices of the segments in the cells that
+        overlap box, given as (min x, min y, max x, max y)."""
+        found = set()
+        # Widen the box a little so that rounding can not lose a segment
+        # passing through its corner.
+        margin = self.cell_size * 1e-9
+        if (box[2] + margin < self.min_x or box[3] + margin < self.min_y or
+                box[0] - margin > self.min_x + self.columns * self.cell_size or
+                box[1] - margin > self.min_y + self.rows * self.cell_size):
+            return found
+        for column in range(self._column(box[0] - margin),
+                            self._column(box[2] + margin) + 1):
+            for row in range(self._row(box[1] - margin),
+                             self._row(box[3] + margin) + 1):
+                found.update(self.cells.get(column * self.rows + row, ()))
+        return found
+
+
+class IntervalIndex(object):
+    """
+    An index of the edges of an obstacle graph by their y-interval, to find
+    the edges that may cross the horizontal half line from a point to the
+    right, which visible_vertices starts its sweep with.
+
+    The y-range of the edges is split into buckets of about the mean height
+    of an edge, and each edge is stored in the buckets its y-interval
+    overlaps, sorted by how far to the right it reaches. A query looks at the
+    bucket of the point, up to the first edge that does not reach the point.
+
+    edge_intersect takes nearly collinear points as collinear, which lets it
+    find crossings with edges that end a hair above or below the half line,
+    or with nearly horizontal edges a little left of the point. The y-range
+    of a query is widened by the first, and the reach of an edge by the
+    second, so no edge crossing the half line is missed.
+
+    The coordinates are kept in flat arrays, and Edges are only created for
+    the edges a query returns.
+    """
+
+    MAX_BUCKETS = 1 << 16
+    # Edges flatter than this are taken to reach arbitrarily far
+    MIN_HEIGHT = 1e-6
+
+    def __init__(self, segments, area):
+        """segments is a sequence of (x1, y1, x2, y2) tuples of the edges,
+        which are returned by query in the same order. area is the largest
+        triangle area ccw takes as collinear."""
+        self.edges = array('d')
+        self.area = area
+        self.low = array('d')
+        self.high = array('d')
+        self.buckets = {}
+        reach = array('d')
+        for x1, y1, x2, y2 in segments:
+            self.edges.extend((x1, y1, x2, y2))
+            self.low.append(min(y1, y2))
+            self.high.append(max(y1, y2))
+            height = abs(y2 - y1)
+            if height < self.MIN_HEIGHT:
+                reach.append(float('inf'))
+            else:
+                width = abs(x2 - x1)
+                reach.append(max(x1, x2) + 2 * width + 2 * area / height)
+        if not self.low:
+            self.bottom = 0.0
+            self.height = 1.0
+            self.count = 1
+            return
+        self.bottom = min(self.low)
+        span = max(self.high) - self.bottom
+        mean_height = sum(h - l for l, h in zip(self.low, self.high)) / len(
+            self.low)
+        self.height = max(mean_height, span / self.MAX_BUCKETS) or 1.0
+        self.count = int(span / self.height) + 1
+        members = {}
+        for k in range(len(self.low)):
+            for bucket in range(self._bucket(self.low[k]),
+                                self._bucket(self.high[k]) + 1):
+                members.setdefault(bucket, []).append((reach[k], k))
+        for bucket, items in members.items():
+            items.sort(reverse=True)
+            self.buckets[bucket] = (array('d', [r for r, _ in items]),
+                                    array('i', [k for _, k in items]))
+
+    def _bucket(self, y):
+        return min(max(int((y - self.bottom) / self.height), 0),
+                   self.count - 1)
+
+    def query(self, point, end_x):
+        """Return the Edges that may cross the line from point to
+        Point(end_x, point.y), in the order they were given. end_x must be
+        at least 1 to the right of point."""
+        x = point.x
+        y = point.y
+        margin = 2 * self.area / (end_x - x)
+        low = self.low
+        high = self.high
+        found = set()
+        for bucket in range(self._bucket(y - margin),
+                            self._bucket(y + margin) + 1):
+            if bucket not in self.buckets:
+                continue
+            reach, members = self.buckets[bucket]
+            for r, k in zip(reach, members):
+                if r < x:
+                    break
+                if low[k] <= y + margin and high[k] >= y - margin:
+                    found.add(k)
+        coords = self.edges
+        return [Edge(Point(coords[4 * k], coords[4 * k + 1]),
+                     Point(coords[4 * k + 2], coords[4 * k + 3]))
+                for k in sorted(found)]
+
+
+class PolygonIndex(object):
+    """
+    An index of the polygons of an obstacle graph for point location.
+
+    The bounding boxes of the polygons are kept in a uniform grid, so only
+    the polygons whose box holds a point are looked at. The edges of each
+    polygon are put in horizontal bands of its box by the y-interval they
+    cover, and a crossing test on a point only looks at the edges in the
+    point's band. These are all the edges polygon_crossing does not skip,
+    so the result is the same as testing all edges of the polygon.
+
+    The coordinates are kept in flat arrays, and Edges are only created for
+    the few edges a query looks at.
+    """
+
+    MAX_CELLS = 256
+    EDGES_PER_BAND = 4
+
+    def __init__(self, polygons):
+        """polygons is a sequence of (polygon ID, segments) pairs, where
+        segments are the (x1, y1, x2, y2) tuples of the edges of the polygon.
+        Polygons are tested in the order of polygons."""
+        self.ids = []
+        self.positions = {}
+        self.boxes = array('d')
+        # x1, y1, x2, y2 of every edge, and per polygon the index of its
+        # first edge, the bottom and height of its bands and the offset of
+        # its bands in band_offsets.
+        self.edges = array('d')
+        self.first_edge = array('i')
+        self.band_bottom = array('d')
+        self.band_height = array('d')
+        self.first_band = array('i', [0])
+        self.band_offsets = array('i', [0])
+        self.band_edges = array('i')
+        self._tree = None
+        for polygon_id, edges in polygons:
+            edges = list(edges)
+            if not edges:
+                continue
+            self.positions[polygon_id] = len(self.ids)
+            self.ids.append(polygon_id)
+            self._add_edges(edges)
+        self._grid()
+
+    def _add_edges(self, edges):
+        min_x = min(min(e[0], e[2]) for e in edges)
+        max_x = max(max(e[0], e[2]) for e in edges)
+        bottom = min(min(e[1], e[3]) for e in edges)
+        top = max(max(e[1], e[3]) for e in edges)
+        self.boxes.extend((min_x, bottom, max_x, top))
+        first = len(self.edges) // 4
+        self.first_edge.append(first)
+        bands = max(1, len(edges) // self.EDGES_PER_BAND)
+        height = (top - bottom) / bands or 1.0
+        self.band_bottom.append(bottom)
+        self.band_height.append(height)
+        members = [[] for _ in range(bands)]
+        for k, e in enumerate(edges):
+            self.edges.extend(e)
+            low = self._band(min(e[1], e[3]), bottom, height, bands)
+            high = self._band(max(e[1], e[3]), bottom, height, bands)
+            for band in range(low, high + 1):
+                members[band].append(first + k)
+        for band in members:
+            self.band_edges.extend(band)
+            self.band_offsets.append(len(self.band_edges))
+        self.first_band.append(self.first_band[-1] + bands)
+
+    @staticmethod
+    def _band(y, bottom, height, bands):
+        return min(max(int((y - bottom) / height), 0), bands - 1)
+
+    def _grid(self):
+        boxes = self.boxes
+        count = len(self.ids)
+        self.cells = {}
+        if not count:
+            self.min_x = self.min_y = 0.0
+            self.cell_size = 1.0
+            self.columns = self.rows = 1
+            return
+        self.min_x = min(boxes[0::4])
+        self.min_y = min(boxes[1::4])
+        width = max(boxes[2::4]) - self.min_x
+        height = max(boxes[3::4]) - self.min_y
+        mean_size = sum(max(boxes[4 * k + 2] - boxes[4 * k],
+                            boxes[4 * k + 3] - boxes[4 * k + 1])
+                        for k in range(count)) / count
+        self.cell_size = max(mean_size, width / self.MAX_CELLS,
+                             height / self.MAX_CELLS) or 1.0
+        self.columns = int(width / self.cell_size) + 1
+        self.rows = int(height / self.cell_size) + 1
+        for k in range(count):
+            for column in range(self._column(boxes[4 * k]),
+                                self._column(boxes[4 * k + 2]) + 1):
+                for row in range(self._row(boxes[4 * k + 1]),
+                                 self._row(boxes[4 * k + 3]) + 1):
+                    cell = column * self.rows + row
+                    if cell not in self.cells:
+                        self.cells[cell] = array('i')
+                    self.cells[cell].append(k)
+
+    def _column(self, x):
+        return min(max(int((x - self.min_x) / self.cell_size), 0),
+                   self.columns - 1)
+
+    def _row(self, y):
+        return min(max(int((y - self.min_y) / self.cell_size), 0),
+                   self.rows - 1)
+
+    def candidate_edges(self, point, polygon_id):
+        """Return the Edges of the polygon with polygon_id that cover the
+        y-coordinate of point, and maybe a few more."""
+        k = self.positions.get(polygon_id)
+        if k is None:
+            return []
+        bands = self.first_band[k + 1] - self.first_band[k]
+        band = self.first_band[k] + self._band(
+            point.y, self.band_bottom[k], self.band_height[k], bands)
+        coords = self.edges
+        edges = []
+        for e in self.band_edges[self.band_offsets[band]:
+                                 self.band_offsets[band + 1]]:
+            edges.append(Edge(Point(coords[4 * e], coords[4 * e + 1]),
+                              Point(coords[4 * e + 2], coords[4 * e + 3])))
+        return edges
+
+    def containing(self, point):
+        """Return the IDs of the polygons whose bounding box holds point, in
+        the order the polygons were given."""
+        x = point.x
+        y = point.y
+        if (x < self.min_x or y < self.min_y or
+                x > self.min_x + self.columns * self.cell_size or
+                y > self.min_y + self.rows * self.cell_size):
+            return []
+        boxes = self.boxes
+        cell = self.cells.get(self._column(x) * self.rows + self._row(y), ())
+        return [self.ids[k] for k in sorted(cell)
+                if boxes[4 * k] <= x <= boxes[4 * k + 2] and
+                boxes[4 * k + 1] <= y <= boxes[4 * k + 3]]
+
+    def tree(self):
+        """Return the EdgeTree of the polygon edges, built on first use."""
+        if self._tree is None:
+            self._tree = EdgeTree(self)
+        return self._tree
+
+    def closest_edge_point(self, point, polygon_id):
+        """Return the Edge of the polygon with polygon_id closest to point
+        and the closest Point on it, the first of the polygon's edges if
+        there is a tie, like the search in closest_point."""
+        k = self.positions[polygon_id]
+        e, u = self.tree().nearest(point, k)
+        coords = self.edges
+        x1, y1, x2, y2 = coords[4 * e:4 * e + 4]
+        edge = Edge(Point(x1, y1), Point(x2, y2))
+        if u < 0:
+            return edge, edge.p1
+        if u > 1:
+            return edge, edge.p2
+        return edge, Point(x1 + u * (x2 - x1), y1 + u * (y2 - y1))
+
+
+class CombinedPolygonIndex(object):
+    """The PolygonIndex of a CombinedGraph, made from the indexes of its two
+    graphs."""
+
+    def __init__(self, index, extra):
+        self.index = index
+        self.extra = extra
+
+    def candidate_edges(self, point, polygon_id):
+        if polygon_id in self.extra.positions:
+            return self.extra.candidate_edges(point, polygon_id)
+        return self.index.candidate_edges(point, polygon_id)
+
+    def containing(self, point):
+        return self.index.containing(point) + self.extra.containing(point)
+
+    def closest_edge_point(self, point, polygon_id):
+        if polygon_id in self.extra.positions:
+            return self.extra.closest_edge_point(point, polygon_id)
+        return self.index.closest_edge_point(point, polygon_id)
+
+
+class CombinedIntervalIndex(object):
+    """The IntervalIndex of a CombinedGraph, made from the indexes of its two
+    graphs."""
+
+    def __init__(self, index, extra):
+        self.index = index
+        self.extra = extra
+
+    def query(self, point, end_x):
+        return self.index.query(point, end_x) + self.extra.query(point, end_x)
+
+
+class EdgeTree(object):
+    """
+    R-trees over the edges of the polygons in a PolygonIndex, one per
+    polygon, to find the edge of a polygon closest to a point in about
+    logarithmic time.
+
+    The trees are packed with the sort-tile-recursive method: the edges are
+    sorted into vertical slices by x, each slice by y, and runs of
+    NODE_SIZE make the leaves; the nodes of a level are packed the same way
+    into the level above. The nodes of all trees are kept in flat arrays in
+    breadth first order, so the children of a node are consecutive nodes,
+    or for a leaf consecutive items of entries, which are indices into the
+    edges of the PolygonIndex.
+    """
+
+    NODE_SIZE = 8
+
+    def __init__(self, index):
+        self.edges = index.edges
+        self.boxes = array('d')
+        self.first = array('i')
+        self.count = array('i')
+        self.leaf = array('b')
+        self.entries = array('i')
+        self.roots = array('i')
+        ends = list(index.first_edge[1:]) + [len(index.edges) // 4]
+        for k, (first, end) in enumerate(zip(index.first_edge, ends)):
+            self.roots.append(len(self.count))
+            # Widen the boxes a little, so that a closest point computed
+            # with rounding is still inside the box of its edge.
+            margin = 1e-9 * (max(abs(v) for v in
+                                 index.boxes[4 * k:4 * k + 4]) + 1)
+            self._add_tree(first, end, margin)
+
+    def _add_tree(self, first, end, margin):
+        coords = self.edges
+        level = []
+        for e in range(first, end):
+            x1, y1, x2, y2 = coords[4 * e:4 * e + 4]
+            if x1 > x2:
+                x1, x2 = x2, x1
+            if y1 > y2:
+                y1, y2 = y2, y1
+            level.append(((x1 - margin, y1 - margin, x2 + margin,
+                           y2 + margin), e))
+        leaf = True
+        while True:
+            level = [((min(b[0] for b, _ in group),
+                       min(b[1] for b, _ in group),
+                       max(b[2] for b, _ in group),
+                       max(b[3] for b, _ in group)), (group, leaf))
+                     for group in self._pack(level)]
+            leaf = False
+            if len(level) == 1:
+                break
+
+        # Store the nodes breadth first
+        base = len(self.count)
+        queue = level
+        k = 0
+        while k < len(queue):
+            box, (group, leaf) = queue[k]
+            k += 1
+            self.boxes.extend(box)
+            self.count.append(len(group))
+            self.leaf.append(leaf)
+            if leaf:
+                self.first.append(len(self.entries))
+                self.entries.extend(e for _, e in group)
+            else:
+                self.first.append(base + len(queue))
+                queue.extend(group)
+
+    def _pack(self, items):
+        """Split items, (box, value) pairs, into groups of NODE_SIZE."""
+        size = self.NODE_SIZE
+        slices = int(ceil(sqrt(ceil(len(items) / size))))
+        per_slice = slices * size
+        items = sorted(items, key=lambda item: item[0][0] + item[0][2])
+        groups = []
+        for start in range(0, len(items), per_slice):
+            column = sorted(items[start:start + per_slice],
+                            key=lambda item: item[0][1] + item[0][3])
+            for k in range(0, len(column), size):
+                groups.append(column[k:k + size])
+        return groups
+
+    def _distance(self, point, node):
+        """Return the distance from point to the box of node."""
+        boxes = self.boxes
+        dx = max(boxes[4 * node] - point.x, 0, point.x - boxes[4 * node + 2])
+        dy = max(boxes[4 * node + 1] - point.y, 0,
+                 point.y - boxes[4 * node + 3])
+        return sqrt(dx**2 + dy**2)
+
+    def nearest(self, point, k):
+        """Return the index of the edge of the polygon at position k closest
+        to point, the lowest if there is a tie, and the parameter u of the
+        closest point on its line. The distance is computed like in
+        closest_point, so the result is the same."""
+        coords = self.edges
+        best = (float('inf'), 0)
+        best_u = None
+        heap = [(0.0, self.roots[k])]
+        while heap:
+            distance, node = heappop(heap)
+            if distance > best[0]:
+                break
+            first = self.first[node]
+            if not self.leaf[node]:
+                for child in range(first, first + self.count[node]):
+                    distance = self._distance(point, child)
+                    if distance <= best[0]:
+                        heappush(heap, (distance, child))
+                continue
+            for e in self.entries[first:first + self.count[node]]:
+                x1, y1, x2, y2 = coords[4 * e:4 * e + 4]
+                num = (point.x - x1) * (x2 - x1) + (point.y - y1) * (y2 - y1)
+                denom = (x2 - x1)**2 + (y2 - y1)**2
+                u = num / denom
+                if u < 0:
+                    x, y = x1, y1
+                elif u > 1:
+                    x, y = x2, y2
+                else:
+                    x, y = x1 + u * (x2 - x1), y1 + u * (y2 - y1)
+                d = sqrt((x - point.x)**2 + (y - point.y)**2)
+                if (d, e) < best:
+                    best = (d, e)
+                    best_u = u
+        return best[1], best_u
+
+
+def _segments(edges):
+    return [(e.p1.x, e.p1.y, e.p2.x, e.p2.y) for e in edges]
+
+
+def polygon_index(graph):
+    """Return the PolygonIndex of the polygons of graph.
+
+    The index is built on first use and kept on graph, which drops it when
+    its polygons change. The index of a CompactGraph is built from its
+    arrays, without creating Edges.
+    """
+    if isinstance(graph, CombinedGraph):
+        return CombinedPolygonIndex(polygon_index(graph.graph),
+                                    polygon_index(graph.extra))
+    index = getattr(graph, '_polygon_index', None)
+    if index is None:
+        if isinstance(graph, CompactGraph):
+            polygons = [(k, graph.polygon_segments(k))
+                        for k in range(len(graph.polygon_offsets) - 1)]
+        else:
+            polygons = [(k, _segments(graph.polygons[k]))
+                        for k in graph.polygons]
+        index = graph._polygon_index = PolygonIndex(polygons)
+    return index
+
+
+def interval_index(graph, area):
+    """Return the IntervalIndex of the edges of graph. area is the largest
+    triangle area ccw takes as collinear.
+
+    The index is built on first use and kept on graph, which drops it when
+    its edges change. The index of a CompactGraph is built from its arrays,
+    without creating Edges.
+    """
+    if isinstance(graph, CombinedGraph):
+        return CombinedIntervalIndex(interval_index(graph.graph, area),
+                                     interval_index(graph.extra, area))
+    index = getattr(graph, '_interval_index', None)
+    if index is None:
+        if isinstance(graph, CompactGraph):
+            segments = graph.segments()
+        else:
+            segments = _segments(graph.get_edges())
+        index = graph._interval_index = IntervalIndex(segments, area)
+    return index
@@ -21,23 +21,53 @@ LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
+from array import array
 from timeit import default_timer
-from sys import stdout, version_info
+from sys import stdout, version_info, platform
+import hashlib
+import os
+from os import getpid
 from multiprocessing import Pool
+from collections import OrderedDict
 from tqdm import tqdm
 from warnings import warn
 
-from pyvisgraph.graph import Graph, Edge
-from pyvisgraph.shortest_path import shortest_path
+from pyvisgraph.graph import Graph, Point, Edge, CombinedGraph
+from pyvisgraph.compact_graph import CompactGraph
+from pyvisgraph.spatial import SegmentGrid, polygon_index
+from pyvisgraph.graph_file import save_graphs, load_graphs, is_graph_file
+from pyvisgraph.shortest_path import shortest_path, compact_shortest_path
+from pyvisgraph.shortest_path import shortest_path_tree, Overlay
+from pyvisgraph.shortest_path import Landmarks, compute_landmarks
+from pyvisgraph.shortest_path import landmark_heuristic, euclidean_heuristic
 from pyvisgraph.visible_vertices import visible_vertices, point_in_polygon
-from pyvisgraph.visible_vertices import closest_point
+from pyvisgraph.visible_vertices import closest_point, edge_intersect
+from pyvisgraph.visible_vertices import unit_vector, edge_distance
+from pyvisgraph.visible_vertices import ccw, CW, CCW
+from pyvisgraph.kinetic import kinetic_vis_graph
+from pyvisgraph import kernels
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+try:
+    import resource
+except ImportError:
+    resource = None
 
 PYTHON3 = version_info[0] == 3
 if PYTHON3:
     xrange = range
     import pickle
+    from queue import Queue
 else:
     import cPickle as pickle
+    from Queue import Queue
+
+# Points per batch of points_in_polygons and closest_points, which bounds
+# the size of the temporary arrays.
+_BATCH_POINTS = 1 << 16
 
 
 class VisGraph(object):
@@ -45,18 +75,78 @@ class VisGraph(object):
     def __init__(self):
         self.graph = None
         self.visgraph = None
+        self.build_stats = None
+        self.reduced = False
+        self.landmarks = None
+        self.endpoint_cache = None
+        self._edge_grid = None
+        self._lazy_cache = None
 
     def load(self, filename):
-        """Load obstacle graph and visibility graph. """
+        """Load obstacle graph and visibility graph.
+
+        Both pickle files and binary graph files (see save) can be loaded.
+        A binary graph file is mapped into memory instead of read, so it
+        loads in milliseconds and the graphs are CompactGraphs reading from
+        it. This is a read-only mode: shortest_path, find_visible,
+        point_in_polygon and closest_point only create short-lived Point and
+        Edge objects, and the pages of the file stay shared between the
+        processes that load it or are forked after loading it. Each process
+        does build the spatial indexes of the obstacles on first use, which
+        are flat arrays of a few dozen bytes per obstacle edge.
+        A pickle file can be converted by loading it and saving it again
+        with binary=True.
+        """
+        self._edge_grid = None
+        self.landmarks = None
+        if is_graph_file(filename):
+            self.graph, self.visgraph, extra = load_graphs(filename, True)
+            flags = extra.get(b'flags')
+            self.reduced = flags is not None and bool(flags[0])
+            if b'lmids' in extra:
+                self.landmarks = Landmarks(extra[b'lmids'], extra[b'lmdist'],
+                                           self.visgraph.version)
+            return
         with open(filename, 'rb') as load:
-            self.graph, self.visgraph = pickle.load(load)
+            graphs = pickle.load(load)
+        self.graph, self.visgraph = graphs[:2]
+        options = graphs[2] if len(graphs) > 2 else {}
+        self.reduced = options.get('reduced', False)
+        if 'landmarks' in options:
+            self.landmarks = Landmarks(*options['landmarks'],
+                                       version=self.visgraph.version)
+
+    def save(self, filename, binary=False):
+        """Save obstacle graph and visibility graph.
 
-    def save(self, filename):
-        """Save obstacle graph and visibility graph. """
+        By default they are pickled. With binary=True they are stored as
+        flat arrays in a versioned binary format instead, which load can map
+        into memory without creating any Point or Edge objects. Whether the
+        visibility graph is reduced (see build) is saved with them, and so
+        are its landmarks (see precompute_landmarks).
+        """
+        landmarks = self._current_landmarks()
+        if binary:
+            extra = {b'flags': array('b', [self.reduced])}
+            if landmarks is not None:
+                extra[b'lmids'] = array('i', landmarks.ids)
+                extra[b'lmdist'] = array('d', landmarks.distances)
+            save_graphs(filename, self.graph, self.visgraph, extra)
+            return
+        graphs = (self.graph, self.visgraph)
+        options = {}
+        if self.reduced:
+            options['reduced'] = True
+        if landmarks is not None:
+            options['landmarks'] = (array('i', landmarks.ids),
+                                    array('d', landmarks.distances))
+        if options:
+            graphs += (options,)
         with open(filename, 'wb') as output:
-            pickle.dump((self.graph, self.visgraph), output, -1)
+            pickle.dump(graphs, output, -1)
 
-    def build(self, input, workers=1, status=True): 
+    def build(self, input, workers=1, status=True, backend='list',
+              costs=None, checkpoint=None, reduced=False, engine='sweep'):
         """Build visibility graph based on a list of polygons.
 
         The input must be a list of polygons, where each polygon is a list of
@@ -67,30 +157,247 @@ class VisGraph(object):
         the number of subprocesses you want. Defaults to 1, i.e. no subprocess
         will be started.
         Set status=False to turn off the statusbar when building.
+        backend selects the structure holding the open edges of the
+        rotational sweep: 'list' or 'skiplist'. The skip list moves fewer
+        items per insert and delete, but is only faster than the list with
+        tens of thousands of edges open at once, see
+        benchmarks/open_edges.py. Both give the same visibility graph.
+        With more than one worker, the points are split into batches by
+        their estimated cost, see _schedule. costs can be the 'costs' dict
+        of a previous build's build_stats, to schedule by the measured time
+        per point instead.
+        After the build, build_stats holds the total time, the time per
+        point, the peak memory use (resident set size in bytes, if it can be
+        read on this platform) and the busy time, utilisation and peak memory
+        of each worker process. Results from the workers are added to the
+        visibility graph as they come in, so a parallel build only needs
+        memory for the final graph plus at most 2 * workers batches of
+        edges, each batch holding about 1% of the edges or less.
+        Set checkpoint to a filename to save every finished batch there as
+        the build goes. If the build is stopped, calling build again with
+        the same input and checkpoint skips the points already done, and
+        gives the same visibility graph as a build that was not stopped.
+        With reduced=True, only the edges a shortest path can take are kept:
+        those tangent to the obstacles at both of their Points, between
+        Points where the polygon's interior angle is not over 180 degrees.
+        No scan is done from the other Points. Shortest paths are the same
+        as with the full visibility graph, with far fewer edges to store and
+        search. A query from or to a polygon Point then scans its visible
+        Points, as its own edges need not be tangent. A reduced visibility
+        graph can not be changed with add_polygon or remove_polygon.
+        engine selects how the visibility graph is found: 'sweep' does a
+        rotational sweep from every Point, 'kinetic' turns one direction
+        for all Points at once, see kinetic_vis_graph. The kinetic engine
+        does less work per pair of Points and gets faster than the sweep as
+        the input grows, see benchmarks/engines.py, except where many Points
+        share a height (e.g. on a grid), as those are still swept. It runs
+        in this process only, so it can not be combined with workers or
+        checkpoint. Both give the same visibility graph; if obstacle edges
+        cross each other, the kinetic engine sweeps from every Point too.
         """
+        if engine not in ('sweep', 'kinetic'):
+            raise ValueError("Unknown engine: {}".format(engine))
+        if engine == 'kinetic' and (workers != 1 or checkpoint is not None):
+            raise ValueError(
+                "The kinetic engine does not support workers or checkpoint")
 
         self.graph = Graph(input)
         self.visgraph = Graph([])
+        self.reduced = reduced
+        self.landmarks = None
+        self._edge_grid = None
 
         points = self.graph.get_points()
         batch_size = 10 
+        start = default_timer()
+        todo = list(xrange(len(points)))
+        concave = None
+        if reduced:
+            concave = _concave_points(self.graph)
+            todo = [i for i in todo if points[i] not in concave]
+        saved = None
+        if checkpoint is not None:
+            saved = _Checkpoint(checkpoint, points, reduced)
+            for i, j in saved.restore():
+                self.visgraph.add_edge(Edge(points[i], points[j]))
+            todo = [i for i in todo if i not in saved.done]
 
-        if workers == 1:
-            for batch in tqdm([points[i:i + batch_size]
-                               for i in xrange(0, len(points), batch_size)],
-                            disable=not status):
-                for edge in _vis_graph(self.graph, batch):
-                    self.visgraph.add_edge(edge)
+        results = []
+        try:
+            if engine == 'kinetic':
+                for edge in kinetic_vis_graph(self.graph, backend):
+                    if concave is None or (edge.p1 not in concave and
+                                           edge.p2 not in concave and
+                                           _grazes(self.graph, edge.p1,
+                                                   edge.p2) and
+                                           _grazes(self.graph, edge.p2,
+                                                   edge.p1)):
+                        self.visgraph.add_edge(edge)
+                results.append((getpid(), default_timer() - start, todo, [],
+                                _peak_rss()))
+            elif workers == 1:
+                index = dict((p, i) for i, p in enumerate(points))
+                for k in tqdm(xrange(0, len(todo), batch_size),
+                              disable=not status):
+                    batch = todo[k:k + batch_size]
+                    times = []
+                    edges = _vis_graph(self.graph, [points[i] for i in batch],
+                                       backend, times, concave)
+                    for edge in edges:
+                        self.visgraph.add_edge(edge)
+                    if saved is not None:
+                        saved.add(batch, [(index[edge.p1], index[edge.p2])
+                                          for edge in edges])
+                    results.append((getpid(), sum(times), batch, times,
+                                    _peak_rss()))
+            else:
+                self._build_parallel(points, todo, workers, status, backend,
+                                     costs, saved, results, concave)
+        finally:
+            if saved is not None:
+                saved.close()
+        self.build_stats = _build_stats(points, results,
+                                        default_timer() - start)
+
+    def _build_parallel(self, points, todo, workers, status, backend, costs,
+                        saved, results, concave):
+        # The obstacle graph is sent to each worker once, batches only
+        # carry point indices and results come back as index pairs.
+        pool = Pool(workers, _init_build_worker,
+                    (self.graph, points, backend, concave))
+        if costs is None:
+            estimates = _estimate_costs(points)
         else:
-            pool = Pool(workers)
-            batches = [(self.graph, points[i:i + batch_size])
-                       for i in xrange(0, len(points), batch_size)]
+            known = [costs[p] for p in points if p in costs]
+            mean = sum(known) / len(known) if known else 1.0
+            estimates = [costs.get(p, mean) for p in points]
+        batches = [[todo[k] for k in batch]
+                   for batch in _schedule([estimates[i] for i in todo],
+                                          workers)]
+
+        # Batches are merged into the visibility graph as they finish.
+        # At most 2 * workers batches are handed out and not yet merged,
+        # so the memory used beyond the final graph is bounded by the
+        # edges of those batches, see _schedule.
+        try:
+            for result in tqdm(_imap_bounded(pool, _vis_graph_wrapper,
+                                             batches, 2 * workers),
+                               total=len(batches), disable=not status):
+                for i, j in result[5]:
+                    self.visgraph.add_edge(Edge(points[i], points[j]))
+                if saved is not None:
+                    saved.add(result[2], result[5])
+                results.append(result[:5])
+        finally:
+            pool.terminate()
 
-            results = list(tqdm(pool.imap(_vis_graph_wrapper, batches), total=len(batches),
-                disable=not status))
-            for result in results:
-                for edge in result:
-                    self.visgraph.add_edge(edge)
+    def compact(self, lengths=True):
+        """Replace the visibility graph with a CompactGraph.
+
+        The CompactGraph holds the same edges in flat arrays, which takes a
+        fraction of the memory. It can be saved, loaded and used to find
+        shortest paths like before, but update can no longer add to it.
+        Set lengths=False to not precompute the edge lengths.
+        """
+
+        landmarks = self._current_landmarks()
+        self.visgraph = CompactGraph.from_graph(self.visgraph, lengths)
+        self._edge_grid = None
+        # The vertex ids are in the same order as the landmark distances
+        if landmarks is not None:
+            self.landmarks = Landmarks(landmarks.ids, landmarks.distances,
+                                       self.visgraph.version)
+
+    def add_polygon(self, polygon):
+        """Add polygon, a list of in-order Points, to the obstacles and
+        update the visibility graph. Returns the polygon_id of the polygon.
+
+        The visibility scan is repeated only from the Points that may see
+        the new polygon: those with a visible Point in its direction, and
+        those visible from the new Points. The result is the same visibility
+        graph as building it again with the polygon added, except where the
+        sweep (see visible_vertices) reports an edge through the polygon
+        from a Point with no other visible Point in that direction. That
+        Point is not scanned again, so the edge a new build would report is
+        left out. With simple polygons this has not been seen.
+        """
+
+        self._check_changeable()
+        self._edge_grid = None
+        affected = self._facing(_polygon_edges(polygon), shadows=False)
+        polygon_id = self.graph.add_polygon(polygon)
+        new_points = set(polygon)
+        for p in new_points:
+            for v in visible_vertices(p, self.graph):
+                if p in _scanned_from(Edge(p, v)):
+                    self.visgraph.add_edge(Edge(p, v))
+                if v not in new_points:
+                    affected.add(v)
+        self._rescan(affected)
+        return polygon_id
+
+    def remove_polygon(self, polygon_id):
+        """Remove the polygon with polygon_id from the obstacles and update
+        the visibility graph.
+
+        The visibility scan is repeated only from the Points that could see
+        the polygon, either directly or past one of their visible Points.
+        The result is the same visibility graph as building it again
+        without the polygon, with the same exception as for add_polygon.
+        """
+
+        self._check_changeable()
+        self._edge_grid = None
+        polygon_edges = self.graph.polygons[polygon_id]
+        points = set(p for e in polygon_edges for p in (e.p1, e.p2))
+        affected = self._facing(polygon_edges, shadows=True)
+        self.graph.remove_polygon(polygon_id)
+        for p in points:
+            if p not in self.graph:
+                for edge in list(self.visgraph[p]):
+                    self.visgraph.remove_edge(edge)
+        self._rescan(p for p in affected if p in self.graph)
+
+    def _facing(self, polygon_edges, shadows):
+        """Return the Points of the visibility graph with a visibility edge
+        crossing polygon_edges. With shadows=True, also those that would see
+        them past one of their visible Points if it did not block the view,
+        i.e. those that can see more when the polygon is removed."""
+        polygon_edges = list(polygon_edges)
+        box = _bounding_box([p for e in polygon_edges for p in (e.p1, e.p2)])
+        facing = set()
+        for edge in self.visgraph.get_edges():
+            if _crosses(edge.p1, edge.p2, 1.0, box, polygon_edges):
+                facing.add(edge.p1)
+                facing.add(edge.p2)
+            elif shadows:
+                for p, v in ((edge.p1, edge.p2), (edge.p2, edge.p1)):
+                    if (_grazes(self.graph, p, v) and
+                            _crosses(p, v, float('inf'), box,
+                                     polygon_edges)):
+                        facing.add(p)
+        return facing
+
+    def _rescan(self, points):
+        """Replace the visibility edges found by the half visibility scan of
+        each Point in points with the result of a new scan."""
+        points = set(points)
+        for p in points:
+            for edge in list(self.visgraph[p]):
+                owners = _scanned_from(edge)
+                if p in owners and all(q in points for q in owners):
+                    self.visgraph.remove_edge(edge)
+        for edge in _vis_graph(self.graph, list(points)):
+            self.visgraph.add_edge(edge)
+
+    def _check_changeable(self):
+        if not (isinstance(self.graph, Graph) and
+                isinstance(self.visgraph, Graph)):
+            raise TypeError("A VisGraph with a CompactGraph can not be "
+                            "changed, build it again instead")
+        if self.reduced:
+            raise TypeError("A reduced VisGraph can not be changed, build it "
+                            "again instead")
 
     def find_visible(self, point):
         """Find vertices visible from point."""
@@ -100,34 +407,370 @@ class VisGraph(object):
     def update(self, points, origin=None, destination=None):
         """Update visgraph by checking visibility of Points in list points."""
 
+        self._edge_grid = None
         for p in points:
             for v in visible_vertices(p, self.graph, origin=origin,
                                       destination=destination):
                 self.visgraph.add_edge(Edge(p, v))
 
-    def shortest_path(self, origin, destination):
+    def shortest_path(self, origin, destination, algorithm='dijkstra',
+                      extra_obstacles=None):
         """Find and return shortest path between origin and destination.
 
         Will return in-order list of Points of the shortest path found. If
         origin or destination are not in the visibility graph, their respective
         visibility edges will be found, but only kept temporarily for finding
-        the shortest path. 
+        the shortest path. See cache_endpoints to keep them for the next
+        queries instead.
+        algorithm is 'dijkstra' or 'astar'. A* uses the straight line distance
+        to destination to search towards it first, and settles far fewer
+        points on long paths. Both find a shortest path. With landmarks (see
+        precompute_landmarks), A* also uses the lower bounds they give for
+        the distance to destination, which guide it around obstacles.
+        extra_obstacles is a list of polygons, like the input of build, to
+        go around in this query only. The visibility edges crossing them are
+        found with a spatial index and left out of the search, and the
+        visibility edges of their Points are added, also only for this
+        query. The visibility graph itself is not changed.
         """
 
-        origin_exists = origin in self.visgraph
-        dest_exists = destination in self.visgraph
-        if origin_exists and dest_exists:
-            return shortest_path(self.visgraph, origin, destination)
-        orgn = None if origin_exists else origin
-        dest = None if dest_exists else destination
+        if isinstance(self.visgraph, CompactGraph):
+            return self._compact_shortest_path(origin, destination, algorithm,
+                                               extra_obstacles)
+        obstacles = self.graph
         add_to_visg = Graph([])
+        removed = Graph([])
+        if extra_obstacles:
+            obstacles = self._add_extra_obstacles(extra_obstacles, add_to_visg,
+                                                  removed.add_edge)
+        if (self._has_edges(origin) and self._has_edges(destination) and
+                not extra_obstacles):
+            heuristic = None
+            if algorithm == 'astar':
+                heuristic = self._landmark_heuristic(destination, [])
+            return shortest_path(self.visgraph, origin, destination,
+                                 algorithm=algorithm, heuristic=heuristic)
+        self._add_endpoint_edges(origin, destination, obstacles,
+                                 add_to_visg.add_edge)
+        heuristic = None
+        if algorithm == 'astar' and not extra_obstacles:
+            heuristic = self._landmark_heuristic(
+                destination, add_to_visg.get_adjacent_points(destination))
+        return shortest_path(self.visgraph, origin, destination, add_to_visg,
+                             algorithm, removed, heuristic)
+
+    def cache_endpoints(self, size=1024, resolution=None):
+        """Keep the visible Points of the origins and destinations of
+        shortest_path that are not in the visibility graph, for the next
+        queries from or to the same places. Returns the EndpointCache,
+        which counts its hits and misses.
+
+        At most size endpoints are kept, dropping the one used longest ago.
+        With resolution, endpoints are looked up by their coordinates
+        rounded to a multiple of it, so endpoints closer than resolution
+        can share their visible Points. Only set it if such endpoints can
+        see the same Points, e.g. for ports given with varying precision.
+        The cache is emptied when the obstacles change. Set size=0 to stop
+        caching.
+        """
+
+        self.endpoint_cache = EndpointCache(size, resolution) if size else None
+        return self.endpoint_cache
+
+    def shortest_path_lazy(self, origin, destination, cache_size=1024):
+        """Find and return shortest path between origin and destination
+        without the visibility graph, so build is not needed.
+
+        Runs A* over the obstacle graph, where the visible Points of a
+        polygon Point are only found, with visible_vertices, when the search
+        expands it. Like in a reduced visibility graph (see build), only the
+        edges tangent to the obstacles at both ends are followed between
+        polygon Points, which gives the same shortest paths with far fewer
+        Points to expand. The visible Points of the cache_size polygon
+        Points used last are kept for the next queries, until the obstacles
+        change. Only the obstacle graph is used, which can also be set
+        directly, e.g. g.graph = Graph(polygons). For a few queries on many
+        obstacles this is much faster than building the visibility graph
+        first, see benchmarks/lazy.py.
+        """
+
+        key = (self.graph, self.graph.version)
+        if self._lazy_cache is None or self._lazy_cache[:2] != key:
+            self._lazy_cache = key + (_concave_points(self.graph),
+                                      OrderedDict())
+        _, _, concave, cache = self._lazy_cache
+        lazy = _LazyVisGraph(self.graph, concave, cache, cache_size, origin,
+                             destination)
+        return shortest_path(lazy, origin, destination, algorithm='astar')
+
+    def _has_edges(self, point):
+        """Return True if all visibility edges of point are in the
+        visibility graph. In a reduced one, those of polygon Points are
+        not."""
+        return point in self.visgraph and not (self.reduced and
+                                               point in self.graph)
+
+    def _compact_shortest_path(self, origin, destination, algorithm,
+                               extra_obstacles):
+        overlay = Overlay(self.visgraph)
+        obstacles = self.graph
+        if extra_obstacles:
+            obstacles = self._add_extra_obstacles(extra_obstacles, overlay,
+                                                  overlay.remove_edge)
+        self._add_endpoint_edges(origin, destination, obstacles,
+                                 overlay.add_edge)
+        heuristic = None
+        if algorithm == 'astar' and not extra_obstacles:
+            i = overlay.find(destination)
+            heuristic = self._landmark_heuristic(
+                destination, [overlay.point(j) for j, _ in
+                              overlay.edges.get(i, ())], overlay)
+        return compact_shortest_path(self.visgraph, origin, destination,
+                                     overlay, algorithm, heuristic)
+
+    def precompute_landmarks(self, k=16):
+        """Choose k landmark Points of the visibility graph and find the
+        shortest path distances from each of them to all its Points.
+
+        For any two Points, the difference of their distances to a landmark
+        is a lower bound of the distance between them. shortest_path with
+        algorithm='astar' uses the largest of these bounds as heuristic
+        (ALT), which is much tighter than the straight line where the paths
+        go around large obstacles, so far fewer Points are settled. The
+        landmarks are chosen far apart, see compute_landmarks, and their
+        distances take 8 * k bytes per Point. They are saved and loaded
+        with the graphs, and are no longer used once the visibility graph
+        is changed, e.g. by add_polygon.
+        """
+
+        graph = self.visgraph
+        if not isinstance(graph, CompactGraph):
+            graph = CompactGraph.from_graph(graph)
+        self.landmarks = compute_landmarks(graph, k, self.visgraph.version)
+
+    def _current_landmarks(self):
+        """Return the landmarks if they are for the visibility graph as it
+        is, else None."""
+        landmarks = self.landmarks
+        if (landmarks is None or not len(landmarks) or
+                landmarks.version != self.visgraph.version):
+            return None
+        return landmarks
+
+    def _landmark_heuristic(self, destination, neighbours, overlay=None):
+        """Return the A* heuristic with the landmarks for paths to
+        destination, or None without landmarks. If destination is not in
+        the visibility graph, its distances to the landmarks are found from
+        its visible Points in neighbours. With a CompactGraph, the heuristic
+        takes the vertex ids of overlay.
+        In a reduced visibility graph, the distances between Points are
+        those of paths leaving and reaching them along a tangent, which can
+        be longer than the shortest. The distances of destination are then
+        always found from neighbours, and only the bounds of destination's
+        distance minus that of a Point hold."""
+        landmarks = self._current_landmarks()
+        if landmarks is None:
+            return None
+        if isinstance(self.visgraph, CompactGraph):
+            vertex_id = self.visgraph.vertex_id
+        else:
+            if landmarks.index is None:
+                points = sorted(self.visgraph.get_points(),
+                                key=lambda p: (p.x, p.y))
+                landmarks.index = dict((p, i) for i, p in enumerate(points))
+            index = landmarks.index
+            vertex_id = lambda p: index.get(p, -1)
+        i = -1 if self.reduced else vertex_id(destination)
+        if i != -1:
+            target = landmarks.row(i)
+        else:
+            target = None
+            for v in neighbours:
+                j = vertex_id(v)
+                if j == -1:
+                    continue
+                length = edge_distance(v, destination)
+                row = [d + length for d in landmarks.row(j)]
+                target = row if target is None else list(map(min, target, row))
+            if target is None:
+                return None
+
+        if overlay is not None:
+            n = len(self.visgraph)
+            euclidean = euclidean_heuristic(overlay, destination)
+            row = lambda v: landmarks.row(v) if v < n else None
+        else:
+            euclidean = lambda p: edge_distance(p, destination)
+
+            def row(p):
+                i = vertex_id(p)
+                return landmarks.row(i) if i != -1 else None
+        return landmark_heuristic(target, row, euclidean, not self.reduced)
+
+    def _add_endpoint_edges(self, origin, destination, obstacles, add_edge):
+        """Call add_edge with the visibility Edges of origin and destination
+        if they are not in the visibility graph. With an endpoint_cache,
+        their visible Points are taken from it, unless obstacles has extra
+        obstacles for this query."""
+        origin_exists = self._has_edges(origin)
+        dest_exists = self._has_edges(destination)
+        # Polygon Points are found by the scans anyway
+        orgn = None if origin_exists or origin in self.graph else origin
+        dest = (None if dest_exists or destination in self.graph
+                else destination)
+        cache = self.endpoint_cache
+        if cache is None or obstacles is not self.graph:
+            if not origin_exists:
+                for v in visible_vertices(_obstacle_point(obstacles, origin),
+                                          obstacles, destination=dest):
+                    add_edge(Edge(origin, v))
+            if not dest_exists:
+                point = _obstacle_point(obstacles, destination)
+                for v in visible_vertices(point, obstacles, origin=orgn):
+                    add_edge(Edge(destination, v))
+            return
+        for point, exists in ((origin, origin_exists),
+                              (destination, dest_exists)):
+            if not exists:
+                for v in cache.visible(point, obstacles):
+                    add_edge(Edge(point, v))
+        # The cached scans do not look for the other endpoint
+        if (orgn is not None and dest is not None and origin != destination
+                and cache.in_sight(origin, destination, obstacles)):
+            add_edge(Edge(origin, destination))
+
+    def _add_extra_obstacles(self, polygons, add_to_visg, remove):
+        """Add the visibility edges of the Points of polygons to add_to_visg
+        and call remove with each visibility edge crossing polygons. Returns
+        the obstacle graph with the polygons added."""
+        extra = Graph([])
+        polygon_id = max([-1] + list(self.graph.polygons)) + 1
+        copies = []
+        for polygon in polygons:
+            copy = [Point(p.x, p.y) for p in polygon]
+            if extra.add_polygon(copy, polygon_id) != -1:
+                polygon_id += 1
+            copies.append(copy)
+        obstacles = CombinedGraph(self.graph, extra)
+
+        edge, grid = self._edge_index()
+        for polygon in copies:
+            if len(polygon) < 2:
+                continue
+            polygon_edges = _polygon_edges(polygon)
+            box = _bounding_box(polygon)
+            for k in grid.query(box):
+                e = edge(k)
+                if _crosses(e.p1, e.p2, 1.0, box, polygon_edges):
+                    remove(e)
+        for p in extra.get_points():
+            for v in visible_vertices(p, obstacles):
+                add_to_visg.add_edge(Edge(p, v))
+        return obstacles
+
+    def _edge_index(self):
+        """Return a function from index to visibility edge, and a
+        SegmentGrid of the visibility edges by the same indices. Both are
+        kept until the visibility graph changes."""
+        if self._edge_grid is None:
+            if isinstance(self.visgraph, CompactGraph):
+                graph = self.visgraph
+                ends = array('i')
+                for i in xrange(len(graph)):
+                    for j in graph.adjacent(i):
+                        if i < j:
+                            ends.append(i)
+                            ends.append(j)
+
+                def edge(k):
+                    return Edge(graph.point(ends[2 * k]),
+                                graph.point(ends[2 * k + 1]))
+                count = len(ends) // 2
+            else:
+                edge = list(self.visgraph.get_edges()).__getitem__
+                count = len(self.visgraph.get_edges())
+            segments = []
+            for k in xrange(count):
+                e = edge(k)
+                segments.append((e.p1.x, e.p1.y, e.p2.x, e.p2.y))
+            self._edge_grid = (edge, SegmentGrid(segments))
+        return self._edge_grid
+
+    def shortest_path_tree(self, origin, destinations=None):
+        """Find the shortest paths from origin to many destinations at once.
+
+        Runs a single search from origin, which stops as soon as all Points
+        in destinations are reached, or covers the whole visibility graph
+        if destinations is None. Like in shortest_path, origin and
+        destinations that are not in the visibility graph get temporary
+        visibility edges. Returns a ShortestPathTree, with the distance to
+        each destination in distances and the paths available from path.
+        """
+
+        compact = isinstance(self.visgraph, CompactGraph)
+        add_to_visg = Overlay(self.visgraph) if compact else Graph([])
+        origin_exists = self._has_edges(origin)
+        orgn = None if origin_exists or origin in self.graph else origin
         if not origin_exists:
-            for v in visible_vertices(origin, self.graph, destination=dest):
+            for v in visible_vertices(_obstacle_point(self.graph, origin),
+                                      self.graph):
                 add_to_visg.add_edge(Edge(origin, v))
-        if not dest_exists:
-            for v in visible_vertices(destination, self.graph, origin=orgn):
-                add_to_visg.add_edge(Edge(destination, v))
-        return shortest_path(self.visgraph, origin, destination, add_to_visg)
+        for destination in destinations or []:
+            if not self._has_edges(destination) and destination != origin:
+                point = _obstacle_point(self.graph, destination)
+                for v in visible_vertices(point, self.graph, origin=orgn):
+                    add_to_visg.add_edge(Edge(destination, v))
+
+        return shortest_path_tree(self.visgraph, origin, destinations,
+                                  add_to_visg)
+
+    def distance_matrix(self, points, workers=1, predecessors=False,
+                        status=True):
+        """Return the matrix of shortest path distances between all points.
+
+        Points not in the visibility graph are given temporary visibility
+        edges once, checked against the obstacles and each other, instead of
+        once per pair like with shortest_path. Then one search is run from
+        each point, in parallel if workers is more than 1. The result is a
+        NumPy array where row i holds the distances from points[i], with inf
+        for points that can not be reached.
+        With predecessors=True a list is returned as well, where item i is
+        a dict mapping each Point on the shortest paths from points[i] to
+        its predecessor on that path.
+        """
+
+        if np is None:
+            raise ImportError("distance_matrix requires NumPy")
+        compact = isinstance(self.visgraph, CompactGraph)
+        add_to_visg = Overlay(self.visgraph) if compact else Graph([])
+        new_points = []
+        for p in points:
+            if not self._has_edges(p) and p not in new_points:
+                new_points.append(p)
+        others = [p for p in new_points if p not in self.graph]
+        for p in new_points:
+            extra = [q for q in others if q != p]
+            for v in visible_vertices(_obstacle_point(self.graph, p),
+                                      self.graph, extra=extra):
+                add_to_visg.add_edge(Edge(p, v))
+
+        args = (self.visgraph, add_to_visg, points)
+        if workers == 1:
+            # The state is passed on instead of kept in the module global,
+            # which would hold on to the graphs after the call.
+            rows = [_distance_row(i, args)
+                    for i in tqdm(xrange(len(points)), disable=not status)]
+        else:
+            pool = Pool(workers, _init_distance_worker, args)
+            try:
+                rows = list(tqdm(pool.imap(_distance_row, xrange(len(points))),
+                                 total=len(points), disable=not status))
+            finally:
+                pool.terminate()
+        matrix = np.array([row for row, _ in rows], dtype=float)
+        if predecessors:
+            return matrix, [preds for _, preds in rows]
+        return matrix
 
     def point_in_polygon(self, point):
         """Return polygon_id if point in a polygon, -1 otherwise."""
@@ -143,16 +786,532 @@ class VisGraph(object):
 
         return closest_point(point, self.graph, polygon_id, length)
 
+    def points_in_polygons(self, points):
+        """Return the polygon_id of each point, -1 for points not in a
+        polygon, as a NumPy array.
+
+        points is an array of x, y pairs. The result is the same as
+        point_in_polygon gives for each point, but the crossing tests are
+        done with NumPy for all points at once.
+        """
+
+        if np is None:
+            raise ImportError("points_in_polygons requires NumPy")
+        xy = np.asarray(points, dtype=float).reshape(-1, 2)
+        index = polygon_index(self.graph)
+        result = np.empty(len(xy), dtype=np.int64)
+        for start in xrange(0, len(xy), _BATCH_POINTS):
+            batch = xy[start:start + _BATCH_POINTS]
+            result[start:start + len(batch)] = kernels.points_in_polygons(
+                index, batch[:, 0], batch[:, 1])
+        return result
+
+    def closest_points(self, points, polygon_ids, length=0.001):
+        """Return the closest point outside its polygon of each point, as a
+        NumPy array of x, y pairs.
+
+        points is an array of x, y pairs and polygon_ids the polygon_id of
+        each point, like points_in_polygons returns. Points with polygon_id
+        -1 are returned as they are, the others are moved like closest_point
+        moves them, with the nearest boundary points found in the polygons'
+        edge trees with NumPy for all points at once.
+        """
+
+        if np is None:
+            raise ImportError("closest_points requires NumPy")
+        xy = np.asarray(points, dtype=float).reshape(-1, 2)
+        polygon_ids = np.asarray(polygon_ids).reshape(-1)
+        result = xy.copy()
+        inside = np.flatnonzero(polygon_ids != -1)
+        if not len(inside):
+            return result
+        index = polygon_index(self.graph)
+        vertices = []
+        for start in xrange(0, len(inside), _BATCH_POINTS):
+            rows = inside[start:start + _BATCH_POINTS]
+            x = xy[rows, 0]
+            y = xy[rows, 1]
+            cx, cy, vertex = kernels.closest_points(
+                index, x, y, polygon_ids[rows].tolist())
+            dx = cx - x
+            dy = cy - y
+            magnitude = kernels.edge_distance(x, y, cx, cy)
+            for k in np.flatnonzero(~vertex & (magnitude == 0)):
+                # Raises the error closest_point gives for this point
+                closest_point(Point(x[k], y[k]), self.graph,
+                              polygon_ids[rows[k]], length)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                result[rows, 0] = cx + dx / magnitude * length
+                result[rows, 1] = cy + dy / magnitude * length
+            for k in np.flatnonzero(vertex):
+                vertices.append((rows[k], Point(float(cx[k]), float(cy[k]))))
+
+        # Points closest to a polygon vertex are moved along the bisector
+        # of its edges, to the side outside all polygons.
+        if not vertices:
+            return result
+        moves = []
+        for i, c in vertices:
+            edges = list(self.graph[c])
+            v1 = unit_vector(c, edges[0].get_adjacent(c))
+            v2 = unit_vector(c, edges[1].get_adjacent(c))
+            vsum = unit_vector(Point(0, 0), Point(v1.x + v2.x, v1.y + v2.y))
+            moves.append((c.x, c.y, vsum.x * length, vsum.y * length))
+        moves = np.array(moves)
+        rows = np.array([i for i, _ in vertices])
+        close1 = moves[:, :2] + moves[:, 2:]
+        close2 = moves[:, :2] - moves[:, 2:]
+        outside = self.points_in_polygons(close1) == -1
+        result[rows] = np.where(outside[:, None], close1, close2)
+        return result
+
+
+def _bounding_box(points):
+    return (min(p.x for p in points), min(p.y for p in points),
+            max(p.x for p in points), max(p.y for p in points))
+
+
+def _scanned_from(edge):
+    """Return the end points of edge whose half visibility scan (see
+    visible_vertices) covers the other end point, which is the lower one,
+    or both if they are at the same height."""
+    p1, p2 = edge.p1, edge.p2
+    if p1.y == p2.y:
+        return (p1, p2)
+    return (p1,) if p1.y < p2.y else (p2,)
+
+
+def _grazes(graph, p, v):
+    """Return True if the line of sight from p to v can continue past v,
+    i.e. the obstacle edges at v are all on one side of it."""
+    sides = set(ccw(p, v, w) for w in graph.get_adjacent_points(v))
+    return not (CW in sides and CCW in sides)
+
+
+def _obstacle_point(graph, point):
+    """Return the Point of graph equal to point, which has its polygon_id,
+    or point if it is not in graph. The visibility scan from a polygon
+    Point needs its polygon_id to leave out the edges inside the
+    polygon."""
+    for edge in graph[point]:
+        return edge.p1 if edge.p1 == point else edge.p2
+    return point
+
+
+def _concave_points(graph):
+    """Return the set of Points of the polygons of graph where the interior
+    angle is over 180 degrees. The polygon Edges go from each Point to the
+    next, which gives the orientation of the polygon."""
+    concave = set()
+    for edges in graph.polygons.values():
+        area = sum(e.p1.x * e.p2.y - e.p2.x * e.p1.y for e in edges)
+        inward = CW if area > 0 else CCW
+        following = dict((e.p1, e.p2) for e in edges)
+        preceding = dict((e.p2, e.p1) for e in edges)
+        for p, q in following.items():
+            # Points shared with other polygons are kept
+            if (p in preceding and len(graph[p]) == 2 and
+                    ccw(preceding[p], p, q) == inward):
+                concave.add(p)
+    return concave
+
+
+class EndpointCache(object):
+    """The visible Points of recent query endpoints, see
+    VisGraph.cache_endpoints.
+
+    Endpoints are looked up by their coordinates, rounded to a multiple of
+    resolution if it is given, except polygon Points which are looked up
+    exactly. The visible Points of at most size endpoints are kept in the
+    order they were used. All are dropped when the obstacle graph is
+    changed, which is noticed from its version. hits and misses count the
+    lookups that found an endpoint and those that had to scan.
+    """
+
+    def __init__(self, size=1024, resolution=None):
+        self.size = size
+        self.resolution = resolution
+        self.hits = 0
+        self.misses = 0
+        self._graph = None
+        self._version = None
+        self._visible = OrderedDict()
+        self._edge_grid = None
+
+    def visible(self, point, graph):
+        """Return the Points of graph visible from point."""
+        self._check_graph(graph)
+        if self.resolution and point not in graph:
+            key = (round(point.x / self.resolution),
+                   round(point.y / self.resolution))
+        else:
+            key = (point.x, point.y)
+        points = self._visible.pop(key, None)
+        if points is None:
+            self.misses += 1
+            points = visible_vertices(_obstacle_point(graph, point), graph)
+        else:
+            self.hits += 1
+        self._visible[key] = points
+        while len(self._visible) > self.size:
+            self._visible.popitem(last=False)
+        return points
+
+    def in_sight(self, p, q, graph):
+        """Return True if the segment from p to q touches no obstacle Edge
+        of graph. Where it only touches a polygon Point, the path through
+        that Point is just as long. Only the Edges near the segment are
+        tested, found with a SegmentGrid of the obstacle Edges which is
+        kept until graph changes."""
+        self._check_graph(graph)
+        if self._edge_grid is None:
+            edges = list(graph.get_edges())
+            segments = [(e.p1.x, e.p1.y, e.p2.x, e.p2.y) for e in edges]
+            self._edge_grid = (edges, SegmentGrid(segments))
+        edges, grid = self._edge_grid
+        for k in grid.query(_bounding_box([p, q])):
+            if edge_intersect(p, q, edges[k]):
+                return False
+        return True
+
+    def _check_graph(self, graph):
+        """Drop everything kept for another graph, or for graph before it
+        was changed."""
+        if graph is not self._graph or graph.version != self._version:
+            self.clear()
+            self._graph = graph
+            self._version = graph.version
+
+    def clear(self):
+        self._visible.clear()
+        self._edge_grid = None
+
+    def __len__(self):
+        return len(self._visible)
+
+
+class _LazyVisGraph(object):
+    """The visibility graph of one query from origin to destination, as far
+    as a search looks at it: graph[v] returns the visibility Edges of v,
+    found when they are asked for. Between polygon Points, only the Edges
+    of the reduced visibility graph (see VisGraph.build) are used. The
+    visible Points of polygon Points are kept in cache, an OrderedDict of at
+    most cache_size Points, with the one used last at the end."""
+
+    def __init__(self, graph, concave, cache, cache_size, origin,
+                 destination):
+        self.graph = graph
+        self.concave = concave
+        self.cache = cache
+        self.cache_size = cache_size
+        self.origin = origin
+        self.destination = destination
+        # Polygon Points are found by the scans anyway
+        orgn = None if origin in graph else origin
+        dest = None if destination in graph else destination
+        self.from_origin = visible_vertices(_obstacle_point(graph, origin),
+                                            graph, destination=dest)
+        self.to_destination = set(visible_vertices(
+            _obstacle_point(graph, destination), graph, origin=orgn))
+
+    def __getitem__(self, point):
+        if point == self.origin:
+            points = self.from_origin
+        elif point in self.graph:
+            points = self._visible(point)
+        else:
+            points = []
+        edges = set(Edge(point, v) for v in points)
+        if point in self.to_destination:
+            edges.add(Edge(point, self.destination))
+        return edges
+
+    def _visible(self, p):
+        """Return the visible Points of polygon Point p along the Edges of
+        the reduced visibility graph, from the cache if it is there."""
+        points = self.cache.pop(p, None)
+        if points is None:
+            points = []
+            if p not in self.concave:
+                for v in visible_vertices(p, self.graph):
+                    if (v not in self.concave and _grazes(self.graph, p, v)
+                            and _grazes(self.graph, v, p)):
+                        points.append(v)
+        self.cache[p] = points
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return points
+
+
+def _polygon_edges(polygon):
+    return [Edge(p, polygon[(i + 1) % len(polygon)])
+            for i, p in enumerate(polygon)]
+
+
+def _crosses(p, v, end, box, edges):
+    """Return True if the points p + t * (v - p) with 0 <= t <= end
+    intersect any of edges, which lie in the bounding box box."""
+    t = _clip_to_box(p, v, box, end)
+    if t is None:
+        return False
+    q = Point(p.x + t * (v.x - p.x), p.y + t * (v.y - p.y))
+    return any(edge_intersect(p, q, edge) for edge in edges)
+
+
+def _clip_to_box(p, v, box, end):
+    """Return the largest t <= end for which p + t * (v - p) is in the axis
+    aligned box (min x, min y, max x, max y), None if there is none with
+    t >= 0."""
+    lo = 0.0
+    hi = end
+    for start, direction, low, high in ((p.x, v.x - p.x, box[0], box[2]),
+                                        (p.y, v.y - p.y, box[1], box[3])):
+        if direction == 0:
+            if start < low or start > high:
+                return None
+            continue
+        t1 = (low - start) / direction
+        t2 = (high - start) / direction
+        lo = max(lo, min(t1, t2))
+        hi = min(hi, max(t1, t2))
+    return hi if lo <= hi else None
+
+
+_distance_state = None
+
+
+def _init_distance_worker(visgraph, add_to_visgraph, points):
+    global _distance_state
+    _distance_state = (visgraph, add_to_visgraph, points)
+
+
+def _distance_row(i, state=None):
+    """Return the distances and predecessors from points[i], with the
+    (visgraph, add_to_visgraph, points) of state or of this worker."""
+    visgraph, add_to_visgraph, points = state or _distance_state
+    tree = shortest_path_tree(visgraph, points[i], points, add_to_visgraph)
+    row = [tree.distances.get(p, float('inf')) for p in points]
+    preds = {}
+    for p in tree.distances:
+        path = tree.path(p)
+        for a, b in zip(path, path[1:]):
+            preds[b] = a
+    return row, preds
+
+
+class _Checkpoint(object):
+    """Append-only file of the finished batches of a build.
+
+    The file starts with a header holding a fingerprint of the points being
+    built and whether the build is reduced, followed by one pickled (point
+    indices, edges as index pairs) record per finished batch. Records are
+    flushed as they are written and synced to disk at most every
+    sync_interval seconds. A record cut short by the build being killed is
+    dropped when the file is read back.
+    """
+    VERSION = 1
+
+    def __init__(self, filename, points, reduced=False, sync_interval=10):
+        self.filename = filename
+        key = [(p.x, p.y, p.polygon_id) for p in points]
+        if reduced:
+            key.append('reduced')
+        self.fingerprint = hashlib.sha1(pickle.dumps(key, 2)).hexdigest()
+        self.sync_interval = sync_interval
+        self.done = set()
+        self._file = None
+
+    def restore(self):
+        """Yield the saved edges as index pairs and collect the indices of
+        the points already done, then open the file to add new batches."""
+        header = ('pyvisgraph checkpoint', self.VERSION, self.fingerprint)
+        good = 0
+        if os.path.exists(self.filename):
+            with open(self.filename, 'rb') as f:
+                try:
+                    saved_header = pickle.load(f)
+                except Exception:
+                    saved_header = None
+                if saved_header is not None and saved_header != header:
+                    raise ValueError("Checkpoint {} was made for a different "
+                                     "input".format(self.filename))
+                if saved_header is not None:
+                    good = f.tell()
+                    while True:
+                        try:
+                            indices, edges = pickle.load(f)
+                        except Exception:
+                            break
+                        self.done.update(indices)
+                        for edge in edges:
+                            yield edge
+                        good = f.tell()
+        self._file = open(self.filename, 'ab' if good else 'wb')
+        self._file.truncate(good)
+        if not good:
+            pickle.dump(header, self._file, 2)
+        self._synced = default_timer()
+
+    def add(self, indices, edges):
+        pickle.dump((list(indices), edges), self._file, 2)
+        self._file.flush()
+        if default_timer() - self._synced > self.sync_interval:
+            os.fsync(self._file.fileno())
+            self._synced = default_timer()
+
+    def close(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+
+_build_state = None
+
+
+def _init_build_worker(graph, points, backend, concave):
+    global _build_state
+    index = dict((p, i) for i, p in enumerate(points))
+    _build_state = (graph, points, index, backend, concave)
+
+
+def _estimate_costs(points):
+    """Estimate the relative time of a half scan from each point.
+
+    A half scan visits the points above the horizontal line through its
+    point, so its cost grows with the number of those points. Sorting the
+    points and finding the initial open edges costs about the same for every
+    point, measured at roughly n/64 visited points.
+    """
+    n = len(points)
+    order = sorted(xrange(n), key=lambda i: (points[i].y, -points[i].x))
+    costs = [0] * n
+    for rank, i in enumerate(order):
+        costs[i] = n - 1 - rank + n / 64.0
+    return costs
+
+
+def _schedule(costs, workers, max_share=0.01):
+    """Split the point indices into batches of decreasing cost.
+
+    The most expensive points go first, and every batch gets 1 / (2 *
+    workers) of the estimated cost still left (guided self-scheduling), but
+    no more than max_share of the total cost, which bounds the edges any one
+    batch returns. Batches shrink towards the end of the build, and a
+    worker takes the next batch as soon as it is done with one. No worker
+    is left waiting on a large batch at the end.
+    """
+    order = sorted(xrange(len(costs)), key=lambda i: -costs[i])
+    remaining = float(sum(costs))
+    largest = remaining * max_share
+    batches = []
+    batch = []
+    batch_cost = 0
+    for i in order:
+        batch.append(i)
+        batch_cost += costs[i]
+        if batch_cost >= min(remaining / (2 * workers), largest):
+            batches.append(batch)
+            remaining -= batch_cost
+            batch = []
+            batch_cost = 0
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _imap_bounded(pool, func, tasks, max_in_flight):
+    """Yield func(task) for each task as it finishes in pool, in any order.
+
+    Unlike Pool.imap_unordered, only max_in_flight tasks are handed to the
+    pool before their results are taken, so results can not pile up. An
+    exception raised by func is raised here.
+    """
+    done = Queue()
+    in_flight = 0
+    for task in tasks:
+        pool.apply_async(_catching, (func, task), callback=done.put)
+        in_flight += 1
+        if in_flight == max_in_flight:
+            ok, result = done.get()
+            in_flight -= 1
+            if not ok:
+                raise result
+            yield result
+    while in_flight:
+        ok, result = done.get()
+        in_flight -= 1
+        if not ok:
+            raise result
+        yield result
+
+
+def _catching(func, task):
+    """Return (True, func(task)), or (False, the exception) if it raises.
+    Pool.apply_async has no error_callback in Python 2, so exceptions are
+    sent back as results instead."""
+    try:
+        return True, func(task)
+    except Exception as e:
+        return False, e
+
+
+def _peak_rss():
+    """Return the peak resident set size of this process in bytes, None if
+    it is not available."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return rss if platform == 'darwin' else rss * 1024
+
+
+def _build_stats(points, results, elapsed):
+    """Summarise the (pid, busy time, indices, times per index, peak rss)
+    of each batch into the build_stats of a VisGraph."""
+    workers = {}
+    costs = {}
+    for pid, busy, indices, times, rss in results:
+        stats = workers.setdefault(pid, {'busy': 0.0, 'batches': 0,
+                                         'points': 0, 'peak_rss': None})
+        stats['busy'] += busy
+        stats['batches'] += 1
+        stats['points'] += len(indices)
+        if rss is not None:
+            stats['peak_rss'] = max(rss, stats['peak_rss'] or 0)
+        for i, t in zip(indices, times):
+            costs[points[i]] = t
+    for stats in workers.values():
+        stats['utilisation'] = stats['busy'] / elapsed if elapsed else 1.0
+    return {'time': elapsed, 'workers': workers, 'costs': costs,
+            'peak_rss': _peak_rss()}
+
 
-def _vis_graph_wrapper(args):
+def _vis_graph_wrapper(batch):
     try:
-        return _vis_graph(*args)
+        graph, points, index, backend, concave = _build_state
+        start = default_timer()
+        times = []
+        edges = _vis_graph(graph, [points[i] for i in batch], backend, times,
+                           concave)
+        return (getpid(), default_timer() - start, batch, times, _peak_rss(),
+                [(index[edge.p1], index[edge.p2]) for edge in edges])
     except KeyboardInterrupt:
         pass
 
-def _vis_graph(graph, points):
+def _vis_graph(graph, points, backend='list', times=None, concave=None):
+    """Return the visibility edges found by the half scans of points. With
+    concave, the set of concave Points of graph, only the edges of the
+    reduced visibility graph (see VisGraph.build) are returned."""
     visible_edges = []
     for p1 in points:
-        for p2 in visible_vertices(p1, graph, scan='half'):
-            visible_edges.append(Edge(p1, p2))
+        start = default_timer()
+        for p2 in visible_vertices(p1, graph, scan='half', backend=backend):
+            if concave is None or (p2 not in concave and
+                                   _grazes(graph, p1, p2) and
+                                   _grazes(graph, p2, p1)):
+                visible_edges.append(Edge(p1, p2))
+        if times is not None:
+            times.append(default_timer() - start)
     return visible_edges
@@ -23,50 +23,44 @@ SOFTWARE.
 """
 from __future__ import division
 from math import pi, sqrt, atan, acos
+from random import Random
 from pyvisgraph.graph import Point
+from pyvisgraph.spatial import polygon_index, interval_index
+from pyvisgraph.constants import INF, CCW, CW, COLLINEAR
+from pyvisgraph.constants import COLIN_TOLERANCE, T, T2
+from pyvisgraph import kernels
 
-INF = 10000
-CCW = 1
-CW = -1
-COLLINEAR = 0
-"""Due to floating point representation error, some functions need to
-   truncate floating point numbers to a certain tolerance."""
-COLIN_TOLERANCE = 10
-T = 10**COLIN_TOLERANCE
-T2 = 10.0**COLIN_TOLERANCE
-
-def visible_vertices(point, graph, origin=None, destination=None, scan='full'):
+"""With NumPy, the functions below are evaluated on arrays of points or
+   edges with the kernels module when there are at least this many."""
+KERNEL_SIZE = 64
+
+
+def visible_vertices(point, graph, origin=None, destination=None, scan='full',
+                     backend='list', extra=None):
     """Returns list of Points in graph visible by point.
 
     If origin and/or destination Points are given, these will also be checked
-    for visibility. scan 'full' will check for visibility against all points in
+    for visibility, as will any Points in the list extra, which must not be
+    in graph. scan 'full' will check for visibility against all points in
     graph, 'half' will check for visibility against half the points. This saves
     running time when building a complete visibility graph, as the points
     that are not checked will eventually be 'point'.
+    backend selects the ordered structure holding the open edges of the
+    sweep, see OPEN_EDGES_BACKENDS.
     """
-    edges = graph.get_edges()
-    points = graph.get_points()
-    if origin: points.append(origin)
-    if destination: points.append(destination)
-    points.sort(key=lambda p: (angle(point, p), edge_distance(point, p)))
-
-    # Initialize open_edges with any intersecting edges on the half line from
-    # point along the positive x-axis
-    open_edges = OpenEdges()
-    point_inf = Point(INF, point.y)
-    for edge in edges:
-        if point in edge: continue
-        if edge_intersect(point, point_inf, edge):
-            if on_segment(point, edge.p1, point_inf): continue
-            if on_segment(point, edge.p2, point_inf): continue
-            open_edges.insert(point, point_inf, edge)
+    others = []
+    if origin: others.append(origin)
+    if destination: others.append(destination)
+    if extra: others.extend(extra)
+    points = _sort_by_angle(point, graph, others, scan == 'half')
+
+    open_edges = initial_open_edges(point, graph, backend)
 
     visible = []
     prev = None
     prev_visible = None
     for p in points:
         if p == point: continue
-        if scan == 'half' and angle(point, p) > pi: break
 
         # Update open_edges - remove clock wise edges incident on p
         if open_edges:
@@ -112,10 +106,78 @@ def visible_vertices(point, graph, origin=None, destination=None, scan='full'):
     return visible
 
 
+def initial_open_edges(point, graph, backend='list'):
+    """Return the open edges at the start of the sweep from point: the
+    edges intersecting the half line from point along the positive x-axis.
+    The interval index of graph gives the edges near the half line."""
+    open_edges = OPEN_EDGES_BACKENDS[backend]()
+    point_inf = Point(INF, point.y)
+    index = interval_index(graph, 1 / T2)
+    if index is not None and point.x <= INF - 1:
+        edges = index.query(point, INF)
+    else:
+        edges = graph.get_edges()
+    for edge in _crossing_edges(point, point_inf, edges):
+        open_edges.insert(point, point_inf, edge)
+    return open_edges
+
+
+def _sort_by_angle(point, graph, others, half):
+    """Return the points of graph and then others sorted by angle from
+    point, then by distance, keeping the order of points with the same angle
+    and distance. With half, only the points at angles up to pi."""
+    if kernels.np is not None:
+        point_at, xs, ys = kernels.point_arrays(graph)
+    if kernels.np is None or len(xs) + len(others) < KERNEL_SIZE:
+        points = graph.get_points() + others
+        points.sort(key=lambda p: (angle(point, p), edge_distance(point, p)))
+        if half:
+            for k, p in enumerate(points):
+                if angle(point, p) > pi:
+                    return points[:k]
+        return points
+    count = len(xs)
+    if others:
+        xs = kernels.np.append(xs, [p.x for p in others])
+        ys = kernels.np.append(ys, [p.y for p in others])
+    return [point_at(i) if i < count else others[i - count] for i in
+            kernels.angular_order(point, xs, ys, half).tolist()]
+
+
+def _crossing_edges(point, point_inf, edges):
+    """Return the edges intersecting the line from point to point_inf,
+    except those with point or an end point on that line."""
+    if kernels.np is not None and len(edges) >= KERNEL_SIZE:
+        edges = list(edges)
+        x1, y1, x2, y2 = kernels.np.array(
+            [(e.p1.x, e.p1.y, e.p2.x, e.p2.y) for e in edges]).T
+        px, py, ix = point.x, point.y, point_inf.x
+        crossing = (
+            ~(((x1 == px) & (y1 == py)) | ((x2 == px) & (y2 == py))) &
+            kernels.edge_intersect(px, py, ix, py, x1, y1, x2, y2) &
+            ~kernels.on_segment(px, py, x1, y1, ix, py) &
+            ~kernels.on_segment(px, py, x2, y2, ix, py))
+        return [e for e, c in zip(edges, crossing.tolist()) if c]
+    crossing = []
+    for edge in edges:
+        if point in edge: continue
+        if edge_intersect(point, point_inf, edge):
+            if on_segment(point, edge.p1, point_inf): continue
+            if on_segment(point, edge.p2, point_inf): continue
+            crossing.append(edge)
+    return crossing
+
+
 def polygon_crossing(p1, poly_edges):
     """Returns True if Point p1 is internal to the polygon. The polygon is
     defined by the Edges in poly_edges. Uses crossings algorithm and takes into
     account edges that are collinear to p1."""
+    if kernels.np is not None and len(poly_edges) >= KERNEL_SIZE:
+        x1, y1, x2, y2 = kernels.np.array(
+            [(e.p1.x, e.p1.y, e.p2.x, e.p2.y) for e in poly_edges]).T
+        px = kernels.np.full(len(x1), p1.x)
+        py = kernels.np.full(len(x1), p1.y)
+        return int(kernels.crossings(px, py, x1, y1, x2, y2).sum()) % 2 == 1
     p2 = Point(INF, p1.y)
     intersect_count = 0
     for edge in poly_edges:
@@ -145,13 +207,19 @@ def edge_in_polygon(p1, p2, graph):
     if p1.polygon_id == -1 or p2.polygon_id == -1:
         return False
     mid_point = Point((p1.x + p2.x) / 2, (p1.y + p2.y) / 2)
-    return polygon_crossing(mid_point, graph.polygons[p1.polygon_id])
+    index = polygon_index(graph)
+    return polygon_crossing(mid_point,
+                            index.candidate_edges(mid_point, p1.polygon_id))
 
 
 def point_in_polygon(p, graph):
-    """Return true if the point p is interior to any polygon in graph."""
-    for polygon in graph.polygons:
-        if polygon_crossing(p, graph.polygons[polygon]):
+    """Return true if the point p is interior to any polygon in graph.
+
+    Only the polygons whose bounding box holds p, and only their edges
+    around the height of p, are looked at, see spatial.PolygonIndex."""
+    index = polygon_index(graph)
+    for polygon in index.containing(p):
+        if polygon_crossing(p, index.candidate_edges(p, polygon)):
             return polygon
     return -1
 
@@ -165,27 +233,11 @@ def closest_point(p, graph, polygon_id, length=0.001):
     """Assumes p is interior to the polygon with polygon_id. Returns the
     closest point c outside the polygon to p, where the distance from c to
     the intersect point from p to the edge of the polygon is length."""
-    polygon_edges = graph.polygons[polygon_id]
-    close_point = None
-    close_edge = None
-    close_dist = None
-    # Finds point closest to p, but on a edge of the polygon.
-    # Solution from http://stackoverflow.com/a/6177788/4896361
-    for i, e in enumerate(polygon_edges):
-        num = ((p.x-e.p1.x)*(e.p2.x-e.p1.x) + (p.y-e.p1.y)*(e.p2.y-e.p1.y))
-        denom = ((e.p2.x - e.p1.x)**2 + (e.p2.y - e.p1.y)**2)
-        u = num/denom
-        pu = Point(e.p1.x + u*(e.p2.x - e.p1.x), e.p1.y + u*(e.p2.y- e.p1.y))
-        pc = pu
-        if u < 0:
-            pc = e.p1
-        elif u > 1:
-            pc = e.p2
-        d = edge_distance(p, pc)
-        if i == 0 or d < close_dist:
-            close_dist = d
-            close_point = pc
-            close_edge = e
+    # Finds point closest to p, but on a edge of the polygon, with the
+    # polygon's edge tree. The search on each edge is the solution from
+    # http://stackoverflow.com/a/6177788/4896361
+    close_edge, close_point = polygon_index(graph).closest_edge_point(
+        p, polygon_id)
 
     # Extend the newly found point so it is outside the polygon by `length`.
     if close_point in close_edge:
@@ -384,3 +436,158 @@ class OpenEdges(object):
 
     def __getitem__(self, index):
         return self._open_edges[index]
+
+
+class _SkipNode(object):
+    __slots__ = ('edge', 'next', 'width')
+
+    def __init__(self, edge, level):
+        self.edge = edge
+        self.next = [None] * level
+        self.width = [0] * level
+
+
+class SkipListOpenEdges(OpenEdges):
+    """OpenEdges kept in an indexable skip list instead of a Python list.
+
+    _less_than is not a strict ordering once the sweep has rotated past
+    edges that are still open, so the structure cannot be searched by value
+    without changing which edges the sweep sees. Instead every link stores
+    how many positions it spans and _index runs the exact same binary search
+    as OpenEdges on positions. Insert and delete then cost O(log k)
+    comparisons plus O(log^2 k) link traversals instead of the O(k) list
+    shift, and smallest is O(1). The level generator is seeded, so the
+    layout is deterministic.
+    """
+    MAX_LEVEL = 32
+    P = 0.25
+
+    def __init__(self, seed=0):
+        self._head = _SkipNode(None, 1)
+        self._head.width[0] = 1
+        self._len = 0
+        self._random = Random(seed).random
+
+    def _locate(self, index):
+        """Return the node before position index on every level, together
+        with the positions of those nodes. The head is at position -1 and a
+        link to None spans up to position len(self)."""
+        level = len(self._head.next)
+        update = [None] * level
+        positions = [0] * level
+        node = self._head
+        pos = -1
+        for i in reversed(range(level)):
+            while node.next[i] is not None and pos + node.width[i] < index:
+                pos += node.width[i]
+                node = node.next[i]
+            update[i] = node
+            positions[i] = pos
+        return update, positions
+
+    def _get(self, index):
+        node = self._head
+        pos = -1
+        for i in reversed(range(len(node.next))):
+            while node.next[i] is not None and pos + node.width[i] <= index:
+                pos += node.width[i]
+                node = node.next[i]
+        return node.edge
+
+    def _insert_at(self, index, edge):
+        level = 1
+        while level < self.MAX_LEVEL and self._random() < self.P:
+            level += 1
+        head = self._head
+        while len(head.next) < level:
+            head.next.append(None)
+            head.width.append(self._len + 1)
+        update, positions = self._locate(index)
+        node = _SkipNode(edge, level)
+        for i in range(len(head.next)):
+            prev = update[i]
+            if i < level:
+                node.next[i] = prev.next[i]
+                node.width[i] = positions[i] + prev.width[i] + 1 - index
+                prev.next[i] = node
+                prev.width[i] = index - positions[i]
+            else:
+                prev.width[i] += 1
+        self._len += 1
+
+    def _delete_at(self, index):
+        update, _ = self._locate(index)
+        node = update[0].next[0]
+        head = self._head
+        for i in range(len(head.next)):
+            prev = update[i]
+            if prev.next[i] is node:
+                prev.next[i] = node.next[i]
+                prev.width[i] += node.width[i] - 1
+            else:
+                prev.width[i] -= 1
+        while len(head.next) > 1 and head.next[-1] is None:
+            head.next.pop()
+            head.width.pop()
+        self._len -= 1
+
+    def insert(self, p1, p2, edge):
+        self._insert_at(self._index(p1, p2, edge), edge)
+
+    def delete(self, p1, p2, edge):
+        index = self._index(p1, p2, edge) - 1
+        # Index -1 refers to the last edge, as it does for OpenEdges.
+        if index < 0:
+            index += self._len
+        if 0 <= index and self._get(index) == edge:
+            self._delete_at(index)
+
+    def smallest(self):
+        return self._head.next[0].edge
+
+    def _index(self, p1, p2, edge):
+        lo = 0
+        hi = self._len
+        # Every probe lies after position lo - 1, so the walk to it starts
+        # from that node (the finger) instead of from the head.
+        finger = self._head
+        finger_pos = -1
+        while lo < hi:
+            mid = (lo+hi)//2
+            node = finger
+            pos = finger_pos
+            while pos < mid:
+                i = len(node.next) - 1
+                while pos + node.width[i] > mid:
+                    i -= 1
+                pos += node.width[i]
+                node = node.next[i]
+            if self._less_than(p1, p2, edge, node.edge):
+                hi = mid
+            else:
+                lo = mid + 1
+                finger = node
+                finger_pos = mid
+        return lo
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        node = self._head.next[0]
+        while node is not None:
+            yield node.edge
+            node = node.next[0]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError(index)
+        return self._get(index)
+
+
+OPEN_EDGES_BACKENDS = {
+    'list': OpenEdges,
+    'skiplist': SkipListOpenEdges,
+}
@@ -13,6 +13,7 @@ setup(
   url = 'https://github.com/TaipanRex/pyvisgraph',
   download_url = 'https://github.com/TaipanRex/pyvisgraph/tarball/0.2.1',
   install_requires = required,
+  extras_require = {'numpy': ['numpy']},
   keywords = ['visibility', 'graph', 'shortest'],
   classifiers = [],
 )
@@ -68,6 +68,11 @@ class TestVisGraphMethods:
         shortest = self.world.shortest_path(self.origin, self.destination)
         assert len(shortest) == 19
 
+    def test_shortest_path_astar(self):
+        shortest = self.world.shortest_path(self.origin, self.destination)
+        assert self.world.shortest_path(self.origin, self.destination,
+                                        algorithm='astar') == shortest
+
     def test_shortest_path_not_update_visgraph(self):
         shortest = self.world.shortest_path(self.origin, self.destination)
         assert self.origin not in self.world.visgraph
@@ -22,12 +22,27 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 from __future__ import division
-from pyvisgraph.graph import Graph, Point, Edge
+from pyvisgraph.graph import Graph, Point, Edge, CombinedGraph
 from pyvisgraph.visible_vertices import edge_intersect, point_edge_distance
 from pyvisgraph.visible_vertices import visible_vertices, angle, point_in_polygon
 from pyvisgraph.visible_vertices import intersect_point, edge_distance
+from pyvisgraph.visible_vertices import SkipListOpenEdges, polygon_crossing
+from pyvisgraph.vis_graph import _estimate_costs, _schedule, _imap_bounded
+from pyvisgraph.visible_vertices import INF, T2, ccw, on_segment
+import pyvisgraph.visible_vertices as pvg_visible_vertices
+from pyvisgraph.spatial import SegmentGrid, polygon_index, interval_index
+from pyvisgraph.graph_file import _array_typecode
+from pyvisgraph.shortest_path import Overlay
 from math import pi, degrees, cos, sin
+import random
+import struct
+import sys
+from array import array
+from multiprocessing import Pool
+import pytest
 import pyvisgraph as vg
+import pyvisgraph.kinetic
+import pyvisgraph.vis_graph
 
 '''
 setup_module(module): only run once when file is executed
@@ -142,6 +157,713 @@ def test_point_edge_distance_function():
     assert point_edge_distance(point_h, point_g, edge3) == 0.9428090415820635
 
 
+class TestKernels:
+    """The NumPy kernels must agree exactly with the scalar functions."""
+
+    def setup_method(self, method):
+        self.np = pytest.importorskip('numpy')
+        from pyvisgraph import kernels
+        self.kernels = kernels
+        r = self.np.random.RandomState(0)
+        n = 3000
+        # Points on a small grid are often collinear or equal, points near
+        # it are nearly so, and random points are neither.
+        grid = r.randint(0, 5, (6, n)).astype(float)
+        near = grid + r.choice([0, 1e-12, -1e-11, 1e-9], (6, n))
+        self.coords = self.np.hstack([grid, near, r.uniform(-5, 5, (6, n))])
+        self.points = [[Point(*xy) for xy in zip(self.coords[k],
+                                                 self.coords[k + 1])]
+                       for k in (0, 2, 4)]
+
+    def test_ccw(self):
+        a, b, c = self.points
+        expected = [ccw(*abc) for abc in zip(a, b, c)]
+        assert self.kernels.ccw(*self.coords).tolist() == expected
+
+    def test_on_segment(self):
+        a, b, c = self.points
+        expected = [on_segment(*abc) for abc in zip(a, b, c)]
+        assert self.kernels.on_segment(*self.coords).tolist() == expected
+
+    def test_edge_intersect(self):
+        a, b, c = self.points
+        d = b[1:] + b[:1]
+        expected = [edge_intersect(p, q, Edge(e1, e2))
+                    for p, q, e1, e2 in zip(a, b, c, d)]
+        x, y = self.coords[2:4]
+        result = self.kernels.edge_intersect(
+            *(list(self.coords) + [self.np.roll(x, -1), self.np.roll(y, -1)]))
+        assert result.tolist() == expected
+
+    def test_angle_distance(self):
+        a, b, _ = self.points
+        angles = self.kernels.angle(*self.coords[:4])
+        assert angles.tolist() == [angle(p, q) for p, q in zip(a, b)]
+        distances = self.kernels.edge_distance(*self.coords[:4])
+        assert distances.tolist() == [edge_distance(p, q)
+                                      for p, q in zip(a, b)]
+
+    def test_crossings(self):
+        a, b, c = self.points
+        counts = self.kernels.crossings(*self.coords).tolist()
+        assert counts == [polygon_crossing(p, [Edge(e1, e2)])
+                          for p, e1, e2 in zip(a, b, c)]
+
+    def test_angular_order(self):
+        a, b, _ = self.points
+        xs, ys = self.coords[2:4]
+        for k in (0, 3000, 6000, 17):
+            p = a[k]
+            keys = [(angle(p, q), edge_distance(p, q)) for q in b]
+            expected = sorted(range(len(b)), key=keys.__getitem__)
+            order = self.kernels.angular_order(p, xs, ys)
+            assert order.tolist() == expected
+            half = [i for i in expected if keys[i][0] <= pi]
+            order = self.kernels.angular_order(p, xs, ys, half=True)
+            assert order.tolist() == half
+
+    def test_sweep(self, monkeypatch):
+        polygons = [[Point(x, y) for x, y in [(0, 0), (2, 0), (2, 2), (1, 3),
+                                               (0, 2)]],
+                    [Point(3 + 0.1 * k, 4 * (k % 2)) for k in range(200)] +
+                    [Point(22, 6), Point(3, 6)]]
+        graph = Graph(polygons)
+        points = [Point(x, y) for x in (-1, 1, 2.5, 5.05, 30)
+                  for y in (0, 1, 2, 4, 5)]
+        expected = [visible_vertices(p, graph) for p in points]
+        inside = [point_in_polygon(p, graph) for p in points]
+        crossings = [polygon_crossing(p, graph.polygons[1]) for p in points]
+        monkeypatch.setattr(pvg_visible_vertices, 'KERNEL_SIZE', 1)
+        assert [visible_vertices(p, graph) for p in points] == expected
+        assert [point_in_polygon(p, graph) for p in points] == inside
+        assert [polygon_crossing(p, graph.polygons[1])
+                for p in points] == crossings
+
+
+def example_polygons():
+    return [[Point(0.0, 1.0), Point(3.0, 1.0), Point(1.5, 4.0)],
+            [Point(4.0, 4.0), Point(7.0, 4.0), Point(5.5, 8.0)],
+            [Point(2.0, 5.0), Point(3.0, 5.0), Point(2.5, 7.0), Point(1.0, 6.0)],
+            [Point(5.0, 0.0), Point(6.0, 2.0), Point(8.0, 1.0), Point(7.0, 3.0),
+             Point(9.0, 3.0), Point(8.0, 0.0)]]
+
+
+def path_polygons():
+    return [example_polygons()[k] for k in (0, 1, 3)]
+
+
+def example_endpoints():
+    """Return path endpoints around path_polygons(): 5 free Points, the
+    concave Point of the last polygon and 3 other polygon Points."""
+    return [Point(0.0, 0.0), Point(10.0, 2.0), Point(6.0, -1.0),
+            Point(7.5, 3.5), Point(4.0, 9.0), Point(3.0, 1.0),
+            Point(8.0, 1.0), Point(9.0, 3.0), Point(5.5, 8.0)]
+
+
+def path_length(path):
+    return sum(edge_distance(a, b) for a, b in zip(path, path[1:]))
+
+
+def check_paths(shortest_path, expected, **kwargs):
+    """Check that shortest_path(origin, destination, **kwargs) finds
+    paths as short as those of the VisGraph expected, between all pairs of
+    example_endpoints()."""
+    endpoints = example_endpoints()
+    for origin in endpoints:
+        for destination in endpoints:
+            path = shortest_path(origin, destination, **kwargs)
+            assert path[0] == origin and path[-1] == destination
+            length = path_length(expected.shortest_path(origin, destination,
+                                                        **kwargs))
+            assert abs(path_length(path) - length) < 1e-9
+
+
+def random_polygons(seed):
+    """Return 9 random polygons, each in its own cell of a grid. The Points
+    are at increasing angles less than pi apart around the center of the
+    cell, so the polygons are star-shaped, and so simple."""
+    rand = random.Random(seed)
+    polygons = []
+    for k in range(9):
+        cx, cy = (k % 3) * 10 + 5, (k // 3) * 10 + 5
+        m = rand.randint(3, 9)
+        phase = rand.uniform(0, 2 * pi)
+        polygon = []
+        for i in range(m):
+            r = rand.uniform(1, 4)
+            polygon.append(Point(cx + r * cos(2 * pi * i / m + phase),
+                                 cy + r * sin(2 * pi * i / m + phase)))
+        polygons.append(polygon)
+    return polygons
+
+
+def test_skiplist_open_edges():
+    """The skip list backend must give the exact same sweep as the list."""
+    list_graph = vg.VisGraph()
+    list_graph.build(example_polygons(), status=False)
+    skip_graph = vg.VisGraph()
+    skip_graph.build(example_polygons(), status=False, backend='skiplist')
+    assert list_graph.visgraph.get_edges() == skip_graph.visgraph.get_edges()
+    for p in list_graph.graph.get_points():
+        assert (visible_vertices(p, list_graph.graph) ==
+                visible_vertices(p, list_graph.graph, backend='skiplist'))
+
+
+def test_skiplist_positions():
+    open_edges = SkipListOpenEdges()
+    expected = []
+    for i in range(200):
+        open_edges._insert_at((i * 7) % (i + 1), i)
+        expected.insert((i * 7) % (i + 1), i)
+    for i in range(100):
+        open_edges._delete_at((i * 3) % len(expected))
+        del expected[(i * 3) % len(expected)]
+    assert list(open_edges) == expected
+    assert len(open_edges) == len(expected)
+    assert open_edges.smallest() == expected[0]
+    assert open_edges[-1] == expected[-1]
+
+
+class TestParallelBuild:
+
+    def setup_method(self, method):
+        self.polys = example_polygons
+        self.g = vg.VisGraph()
+        self.g.build(self.polys(), status=False)
+
+    def test_schedule(self):
+        costs = _estimate_costs(self.g.graph.get_points())
+        batches = _schedule(costs, 2)
+        assert sorted(i for batch in batches for i in batch) == \
+            list(range(len(costs)))
+        batch_costs = [sum(costs[i] for i in batch) for batch in batches]
+        assert batch_costs[0] >= batch_costs[-1]
+        batches = _schedule(costs, 2, max_share=0.1)
+        assert all(sum(costs[i] for i in batch[:-1]) < sum(costs) * 0.1
+                   for batch in batches)
+
+    def test_build_2_workers(self):
+        g = vg.VisGraph()
+        g.build(self.polys(), workers=2, status=False)
+        assert g.visgraph.get_edges() == self.g.visgraph.get_edges()
+        assert sum(w['points'] for w in g.build_stats['workers'].values()) \
+            == len(g.graph.get_points())
+        for stats in g.build_stats['workers'].values():
+            assert 0 < stats['utilisation'] <= 1
+        if g.build_stats['peak_rss'] is not None:
+            assert g.build_stats['peak_rss'] > 0
+
+    def test_batches_carry_indices(self, monkeypatch):
+        # An in-process pool, to see what would be sent to the workers
+        inits = []
+        tasks = []
+        init_build_worker = pyvisgraph.vis_graph._init_build_worker
+        vis_graph_wrapper = pyvisgraph.vis_graph._vis_graph_wrapper
+
+        def init(*args):
+            inits.append(args)
+            init_build_worker(*args)
+
+        def wrapper(batch):
+            tasks.append(batch)
+            return vis_graph_wrapper(batch)
+
+        class InProcessPool(object):
+            def __init__(self, workers, initializer, initargs):
+                for _ in range(workers):
+                    initializer(*initargs)
+
+            def apply_async(self, func, args, callback=None, **kwargs):
+                callback(func(*args))
+
+            def terminate(self):
+                pass
+
+        monkeypatch.setattr(pyvisgraph.vis_graph, 'Pool', InProcessPool)
+        monkeypatch.setattr(pyvisgraph.vis_graph, '_init_build_worker', init)
+        monkeypatch.setattr(pyvisgraph.vis_graph, '_vis_graph_wrapper',
+                            wrapper)
+        monkeypatch.setattr(pyvisgraph.vis_graph, '_build_state', None)
+        g = vg.VisGraph()
+        g.build(self.polys(), workers=2, status=False)
+        assert g.visgraph.get_edges() == self.g.visgraph.get_edges()
+        # The graph is handed to each worker once, with the initializer
+        assert len(inits) == 2
+        assert all(isinstance(args[0], Graph) for args in inits)
+        # and the batches only hold point indices
+        assert len(tasks) > 1
+        assert all(type(i) is int for batch in tasks for i in batch)
+        assert sorted(i for batch in tasks for i in batch) == \
+            list(range(len(g.graph.get_points())))
+
+    def test_worker_exception(self):
+        pool = Pool(1)
+        try:
+            results = _imap_bounded(pool, int, ['1', '2', 'x', '4'], 2)
+            with pytest.raises(ValueError):
+                list(results)
+            assert sorted(_imap_bounded(pool, int, ['1', '2', '3'], 2)) == \
+                [1, 2, 3]
+        finally:
+            pool.terminate()
+
+    def test_build_with_costs(self):
+        costs = self.g.build_stats['costs']
+        assert len(costs) == len(self.g.graph.get_points())
+        g = vg.VisGraph()
+        g.build(self.polys(), workers=2, status=False, costs=costs)
+        assert g.visgraph.get_edges() == self.g.visgraph.get_edges()
+
+
+class TestCheckpoint:
+
+    def setup_method(self, method):
+        self.polys = example_polygons
+        self.g = vg.VisGraph()
+        self.g.build(self.polys(), status=False)
+
+    def interrupted_checkpoint(self, tmp_path):
+        filename = str(tmp_path / 'build.checkpoint')
+        g = vg.VisGraph()
+        g.build(self.polys(), status=False, checkpoint=filename)
+        assert g.visgraph.get_edges() == self.g.visgraph.get_edges()
+        # Cut the file off in the middle of the last record, as if the
+        # build had been killed while writing it.
+        with open(filename, 'rb') as f:
+            data = f.read()
+        with open(filename, 'wb') as f:
+            f.write(data[:-1])
+        return filename
+
+    def test_resume(self, tmp_path):
+        filename = self.interrupted_checkpoint(tmp_path)
+        g = vg.VisGraph()
+        g.build(self.polys(), status=False, checkpoint=filename)
+        assert g.visgraph.get_edges() == self.g.visgraph.get_edges()
+        points = sum(w['points'] for w in g.build_stats['workers'].values())
+        assert 0 < points < len(g.graph.get_points())
+
+    def test_resume_2_workers(self, tmp_path):
+        filename = self.interrupted_checkpoint(tmp_path)
+        g = vg.VisGraph()
+        g.build(self.polys(), workers=2, status=False, checkpoint=filename)
+        assert g.visgraph.get_edges() == self.g.visgraph.get_edges()
+
+    def test_different_input(self, tmp_path):
+        filename = self.interrupted_checkpoint(tmp_path)
+        g = vg.VisGraph()
+        with pytest.raises(ValueError):
+            g.build(self.polys()[:2], status=False, checkpoint=filename)
+
+
+class TestChangePolygons:
+
+    def setup_method(self, method):
+        self.polys = example_polygons
+
+    def build(self, polygons):
+        g = vg.VisGraph()
+        g.build(polygons, status=False)
+        return g
+
+    def test_add_polygon(self):
+        for k in range(len(self.polys())):
+            polygons = self.polys()
+            new = polygons.pop(k)
+            g = self.build(polygons)
+            assert g.add_polygon(new) == len(polygons)
+            expected = self.build(self.polys()[:k] + self.polys()[k + 1:] +
+                                  [self.polys()[k]])
+            assert g.visgraph.get_edges() == expected.visgraph.get_edges()
+            assert g.graph.get_edges() == expected.graph.get_edges()
+            assert g.point_in_polygon(new[0]) == -1
+
+    def test_remove_polygon(self):
+        for k in range(len(self.polys())):
+            g = self.build(self.polys())
+            g.remove_polygon(k)
+            expected = self.build(self.polys()[:k] + self.polys()[k + 1:])
+            assert g.visgraph.get_edges() == expected.visgraph.get_edges()
+            assert (set(g.visgraph.get_points()) ==
+                    set(expected.visgraph.get_points()))
+            assert g.graph.get_edges() == expected.graph.get_edges()
+            assert k not in g.graph.polygons
+
+    def test_random_maps(self):
+        for seed in range(10):
+            polygons = random_polygons(seed)
+            k = seed % len(polygons)
+            g = self.build(polygons[:k] + polygons[k + 1:])
+            g.add_polygon(random_polygons(seed)[k])
+            expected = self.build(random_polygons(seed))
+            assert g.visgraph.get_edges() == expected.visgraph.get_edges()
+            # The polygons after k moved down one id
+            j = (k + 1) % len(polygons)
+            g.remove_polygon(j - 1 if j > k else j)
+            expected = self.build(
+                [p for i, p in enumerate(random_polygons(seed))
+                 if i != j])
+            assert g.visgraph.get_edges() == expected.visgraph.get_edges()
+
+    def test_add_removed_polygon(self):
+        g = self.build(self.polys())
+        edges = g.visgraph.get_edges().copy()
+        g.remove_polygon(1)
+        assert g.add_polygon(self.polys()[1]) == 4
+        assert g.visgraph.get_edges() == edges
+
+    def test_compact(self):
+        g = self.build(self.polys())
+        g.compact()
+        with pytest.raises(TypeError):
+            g.remove_polygon(0)
+
+
+class TestReducedBuild:
+
+    def setup_method(self, method):
+        self.polys = path_polygons
+        self.full = vg.VisGraph()
+        self.full.build(self.polys(), status=False)
+        self.g = vg.VisGraph()
+        self.g.build(self.polys(), status=False, reduced=True)
+
+    def test_reduced_edges(self):
+        edges = self.g.visgraph.get_edges()
+        assert edges < self.full.visgraph.get_edges()
+        # The concave Point of the last polygon is left out
+        assert Point(8.0, 1.0) not in self.g.visgraph
+        for edge in edges:
+            for p, v in ((edge.p1, edge.p2), (edge.p2, edge.p1)):
+                sides = set(ccw(p, v, w)
+                            for w in self.g.graph.get_adjacent_points(v))
+                assert not set([-1, 1]) <= sides
+
+    def test_shortest_paths(self):
+        check_paths(self.g.shortest_path, self.full)
+        check_paths(self.g.shortest_path, self.full, algorithm='astar')
+        check_paths(self.g.shortest_path, self.full, extra_obstacles=[
+            [Point(6.5, 5.0), Point(7.5, 5.0), Point(7.0, 6.0)]])
+
+    def test_compact(self):
+        self.g.compact()
+        check_paths(self.g.shortest_path, self.full)
+
+    def test_build_2_workers(self):
+        g = vg.VisGraph()
+        g.build(self.polys(), workers=2, status=False, reduced=True)
+        assert g.visgraph.get_edges() == self.g.visgraph.get_edges()
+
+    def test_save_load(self, tmp_path):
+        for binary in (False, True):
+            filename = str(tmp_path / 'graph')
+            self.g.save(filename, binary=binary)
+            g2 = vg.VisGraph()
+            g2.load(filename)
+            assert g2.reduced
+            assert g2.visgraph.get_edges() == self.g.visgraph.get_edges()
+            check_paths(g2.shortest_path, self.full)
+        self.full.save(filename, binary=True)
+        g2.load(filename)
+        assert not g2.reduced
+
+    def test_unchangeable(self):
+        with pytest.raises(TypeError):
+            self.g.remove_polygon(0)
+
+
+class TestLazyShortestPath:
+
+    def setup_method(self, method):
+        self.polys = path_polygons
+        self.full = vg.VisGraph()
+        self.full.build(self.polys(), status=False)
+        self.g = vg.VisGraph()
+        self.g.graph = Graph(self.polys())
+
+    def test_shortest_paths(self):
+        check_paths(self.g.shortest_path_lazy, self.full)
+
+    def test_cache(self):
+        self.g.shortest_path_lazy(Point(0.0, 0.0), Point(10.0, 2.0),
+                                  cache_size=2)
+        cache = self.g._lazy_cache[-1]
+        assert 0 < len(cache) <= 2
+        self.g.shortest_path_lazy(Point(0.0, 0.0), Point(10.0, 2.0))
+        assert len(cache) > 2
+        # A new obstacle graph starts with an empty cache
+        self.g.graph = Graph(self.polys()[:2])
+        path = self.g.shortest_path_lazy(Point(7.5, 3.5), Point(10.0, 2.0))
+        assert path == [Point(7.5, 3.5), Point(10.0, 2.0)]
+        assert self.g._lazy_cache[-1] is not cache
+
+    def test_add_polygon(self):
+        self.full.shortest_path_lazy(Point(0.0, 0.0), Point(10.0, 2.0))
+        self.full.add_polygon([Point(8.8, 1.5), Point(9.6, 1.2),
+                               Point(9.4, 2.2)])
+        g = vg.VisGraph()
+        g.build(self.polys() + [[Point(8.8, 1.5), Point(9.6, 1.2),
+                                 Point(9.4, 2.2)]], status=False)
+        for origin, destination in ((Point(0.0, 0.0), Point(10.0, 2.0)),
+                                    (Point(7.5, 3.5), Point(10.0, 2.0))):
+            assert abs(path_length(
+                self.full.shortest_path_lazy(origin, destination)) -
+                path_length(g.shortest_path(origin, destination))) < 1e-9
+
+
+class TestEndpointCache:
+
+    def setup_method(self, method):
+        self.polys = path_polygons
+        self.g = vg.VisGraph()
+        self.g.build(self.polys(), status=False)
+        self.expected = vg.VisGraph()
+        self.expected.build(self.polys(), status=False)
+
+    def test_shortest_paths(self):
+        cache = self.g.cache_endpoints()
+        check_paths(self.g.shortest_path, self.expected)
+        # The polygon Points are in the visibility graph and not looked up
+        assert cache.misses == 5
+        assert cache.hits == 2 * 5 * 9 - 5
+        check_paths(self.g.shortest_path, self.expected)
+        assert cache.misses == 5
+
+    def test_reduced_compact(self):
+        g = vg.VisGraph()
+        g.build(self.polys(), status=False, reduced=True)
+        g.compact()
+        cache = g.cache_endpoints()
+        check_paths(g.shortest_path, self.expected)
+        assert cache.misses == len(example_endpoints())
+
+    def test_in_sight(self):
+        cache = self.g.cache_endpoints()
+        edges = self.g.graph.get_edges()
+        rand = random.Random(0)
+        for _ in range(200):
+            p = Point(rand.uniform(-1, 11), rand.uniform(-1, 10))
+            q = Point(rand.uniform(-1, 11), rand.uniform(-1, 10))
+            expected = not any(edge_intersect(p, q, e) for e in edges)
+            assert cache.in_sight(p, q, self.g.graph) == expected
+        grid = cache._edge_grid
+        assert cache.in_sight(Point(-0.5, 0.0), Point(-0.5, 1.0), self.g.graph)
+        assert cache._edge_grid is grid
+        self.g.graph.add_polygon([Point(-1.0, 0.5), Point(1.0, 0.5),
+                                  Point(0.0, 0.8)])
+        assert not cache.in_sight(Point(-0.5, 0.0), Point(-0.5, 1.0),
+                                  self.g.graph)
+
+    def test_size(self):
+        cache = self.g.cache_endpoints(size=2)
+        check_paths(self.g.shortest_path, self.expected)
+        assert len(cache) == 2
+        assert self.g.cache_endpoints(size=0) is None
+        assert self.g.endpoint_cache is None
+
+    def test_resolution(self):
+        cache = self.g.cache_endpoints(resolution=0.01)
+        self.g.shortest_path(Point(0.0, 0.0), Point(10.0, 2.0))
+        self.g.shortest_path(Point(0.001, 0.0), Point(10.0, 2.001))
+        assert (cache.hits, cache.misses) == (2, 2)
+
+    def test_obstacles_changed(self):
+        cache = self.g.cache_endpoints()
+        version = self.g.graph.version
+        self.g.shortest_path(Point(7.5, 3.5), Point(10.0, 2.0))
+        polygon = [Point(8.8, 1.5), Point(9.6, 1.2), Point(9.4, 2.2)]
+        self.g.add_polygon(polygon)
+        assert self.g.graph.version > version
+        self.expected = vg.VisGraph()
+        self.expected.build(self.polys() + [polygon], status=False)
+        check_paths(self.g.shortest_path, self.expected)
+        assert cache.misses == 2 + 5
+        # Extra obstacles are not cached
+        self.g.shortest_path(Point(0.0, 0.0), Point(10.0, 2.0),
+                             extra_obstacles=[[Point(6.5, 5.0),
+                                               Point(7.5, 5.0),
+                                               Point(7.0, 6.0)]])
+        assert cache.misses == 2 + 5
+
+
+class TestLandmarks:
+
+    def setup_method(self, method):
+        self.polys = path_polygons
+        self.expected = vg.VisGraph()
+        self.expected.build(self.polys(), status=False)
+        self.g = vg.VisGraph()
+        self.g.build(self.polys(), status=False)
+        self.g.precompute_landmarks(3)
+
+    def test_landmarks(self):
+        landmarks = self.g.landmarks
+        assert len(landmarks) == 3 == len(set(landmarks.ids))
+        points = sorted(self.g.visgraph.get_points(),
+                        key=lambda p: (p.x, p.y))
+        for j, i in enumerate(landmarks.ids):
+            for k, p in enumerate(points):
+                distance = path_length(
+                    self.expected.shortest_path(points[i], p))
+                assert abs(landmarks.row(k)[j] - distance) < 1e-9
+
+    def test_shortest_paths(self):
+        assert self.g._landmark_heuristic(Point(4.0, 9.0), []) is None
+        assert self.g._landmark_heuristic(Point(5.5, 8.0), []) is not None
+        check_paths(self.g.shortest_path, self.expected, algorithm='astar')
+        self.g.compact()
+        assert self.g._current_landmarks() is not None
+        check_paths(self.g.shortest_path, self.expected, algorithm='astar')
+
+    def test_reduced(self):
+        g = vg.VisGraph()
+        g.build(self.polys(), status=False, reduced=True)
+        g.precompute_landmarks(3)
+        check_paths(g.shortest_path, self.expected, algorithm='astar')
+
+    def test_save_load(self, tmp_path):
+        for binary in (False, True):
+            filename = str(tmp_path / 'landmarks.graph')
+            self.g.save(filename, binary=binary)
+            g = vg.VisGraph()
+            g.load(filename)
+            assert list(g.landmarks.ids) == list(self.g.landmarks.ids)
+            assert (list(g.landmarks.distances) ==
+                    list(self.g.landmarks.distances))
+            check_paths(g.shortest_path, self.expected, algorithm='astar')
+
+    def test_changed(self):
+        polygon = [Point(8.8, 1.5), Point(9.6, 1.2), Point(9.4, 2.2)]
+        self.g.add_polygon(polygon)
+        assert self.g._current_landmarks() is None
+        self.expected = vg.VisGraph()
+        self.expected.build(self.polys() + [polygon], status=False)
+        check_paths(self.g.shortest_path, self.expected, algorithm='astar')
+
+
+class TestKineticEngine:
+
+    def setup_method(self, method):
+        # Star-shaped obstacles turned by different angles, so no two
+        # Points are at the same height.
+        self.polys = []
+        for k in range(9):
+            cx, cy = (k % 3) * 10 + 5, (k // 3) * 10 + 5
+            m = 4 + k % 5
+            self.polys.append([Point(cx + (2 + (i * k) % 3) *
+                                     cos(2 * pi * i / m + 0.1 * k + 0.05),
+                                     cy + (2 + (i * k) % 3) *
+                                     sin(2 * pi * i / m + 0.1 * k + 0.05))
+                               for i in range(m)])
+
+    def check_same_edges(self, polys, **kwargs):
+        sweep = vg.VisGraph()
+        sweep.build(polys, status=False, **kwargs)
+        kinetic = vg.VisGraph()
+        kinetic.build(polys, status=False, engine='kinetic', **kwargs)
+        assert kinetic.visgraph.get_edges() == sweep.visgraph.get_edges()
+
+    def test_same_edges(self, monkeypatch):
+        scans = []
+
+        def scan(point, *args, **kwargs):
+            scans.append(point)
+            return visible_vertices(point, *args, **kwargs)
+
+        monkeypatch.setattr(pyvisgraph.kinetic, 'visible_vertices', scan)
+        self.check_same_edges(self.polys)
+        # None of the Points needed a scan
+        assert scans == []
+
+    def test_random_maps(self):
+        for seed in range(8):
+            self.check_same_edges(random_polygons(seed))
+
+    def test_crossing_edges(self, monkeypatch):
+        scans = []
+
+        def scan(point, *args, **kwargs):
+            scans.append(point)
+            return visible_vertices(point, *args, **kwargs)
+
+        monkeypatch.setattr(pyvisgraph.kinetic, 'visible_vertices', scan)
+        # Swapping two Points makes a polygon intersect itself
+        polys = random_polygons(3)
+        for poly in polys:
+            poly[0], poly[1] = poly[1], poly[0]
+        self.check_same_edges(polys)
+        # All Points are scanned
+        assert len(scans) == sum(len(poly) for poly in polys)
+
+    def test_same_height(self):
+        # Points at the same height are scanned
+        self.check_same_edges(example_polygons())
+        self.check_same_edges([[Point(0.0, 0.0), Point(2.0, 0.0),
+                                Point(1.0, 1.0)],
+                               [Point(3.0, 0.0), Point(5.0, 1.0),
+                                Point(4.0, 2.0)],
+                               [Point(6.0, 1.0), Point(7.0, 0.5),
+                                Point(8.0, 2.0)]])
+
+    def test_reduced(self):
+        self.check_same_edges(self.polys, reduced=True)
+
+    def test_skiplist(self):
+        self.check_same_edges(example_polygons(), backend='skiplist')
+
+    def test_invalid(self, tmp_path):
+        g = vg.VisGraph()
+        with pytest.raises(ValueError):
+            g.build(self.polys, status=False, engine='rotation')
+        with pytest.raises(ValueError):
+            g.build(self.polys, status=False, engine='kinetic', workers=2)
+        with pytest.raises(ValueError):
+            g.build(self.polys, status=False, engine='kinetic',
+                    checkpoint=str(tmp_path / 'build.ckpt'))
+
+
+class TestExtraObstacles:
+
+    def setup_method(self, method):
+        self.polys = example_polygons
+        self.g = vg.VisGraph()
+        self.g.build(self.polys()[:3], status=False)
+        self.full = vg.VisGraph()
+        self.full.build(self.polys(), status=False)
+        self.queries = [(Point(0.0, 0.0), Point(10.0, 2.0)),
+                        (Point(6.0, -1.0), Point(7.5, 3.5)),
+                        (Point(3.0, 1.0), Point(9.0, 3.0))]
+
+    def check(self, g, **kwargs):
+        edges = g.visgraph.get_edges()
+        for origin, destination in self.queries:
+            path = g.shortest_path(origin, destination,
+                                   extra_obstacles=self.polys()[3:], **kwargs)
+            assert path == self.full.shortest_path(origin, destination)
+        assert g.visgraph.get_edges() == edges
+        # Without the extra obstacles the straight line is free again
+        assert (g.shortest_path(Point(6.0, -1.0), Point(7.5, 3.5)) ==
+                [Point(6.0, -1.0), Point(7.5, 3.5)])
+
+    def test_extra_obstacles(self):
+        self.check(self.g)
+        self.check(self.g, algorithm='astar')
+
+    def test_extra_obstacles_compact(self):
+        self.g.compact()
+        self.check(self.g)
+
+    def test_segment_grid(self):
+        segments = [(0.0, 0.0, 10.0, 10.0), (0.0, 10.0, 10.0, 0.0),
+                    (2.0, 0.0, 2.0, 10.0), (0.0, 2.0, 10.0, 2.0),
+                    (6.0, 6.0, 7.0, 6.5)]
+        grid = SegmentGrid(segments)
+        assert grid.query((6.1, 6.1, 6.9, 6.2)) >= set([0, 4])
+        assert 3 in grid.query((9.0, 1.5, 9.5, 2.5))
+        assert 2 in grid.query((1.9, 9.0, 2.1, 9.5))
+        assert grid.query((20.0, 20.0, 30.0, 30.0)) == set()
+
+
 def test_point_in_polygon():
     g = vg.VisGraph()
     point_a = Point(0,0)
@@ -152,6 +874,73 @@ def test_point_in_polygon():
     assert g.point_in_polygon(point_d) != -1
 
 
+def test_point_in_polygon_index():
+    # A star with many edges, so the crossing test only looks at some
+    star = [Point((3 + 2 * (k % 2)) * cos(k * pi / 50),
+                  (3 + 2 * (k % 2)) * sin(k * pi / 50)) for k in range(100)]
+    graph = Graph([star, [Point(10, 0), Point(12, 0), Point(11, 2)]])
+    for k in range(200):
+        p = Point(-6 + 0.09 * k, 2.8 - 0.03 * k)
+        expected = -1
+        if polygon_crossing(p, graph.polygons[0]):
+            expected = 0
+        assert point_in_polygon(p, graph) == expected
+    assert point_in_polygon(Point(11, 0.5), graph) == 1
+    index = polygon_index(graph)
+    assert len(index.candidate_edges(Point(0, 1), 0)) < 20
+    assert polygon_index(graph) is index
+    assert point_in_polygon(Point(20, 0.5), graph) == -1
+    graph.add_polygon([Point(19, 0), Point(21, 0), Point(20, 2)])
+    assert polygon_index(graph) is not index
+    assert point_in_polygon(Point(20, 0.5), graph) == 2
+    graph.remove_polygon(0)
+    assert point_in_polygon(Point(0, 0), graph) == -1
+
+
+def test_interval_index():
+    # A nearly horizontal edge left of the points, which edge_intersect
+    # takes to cross the half line from them
+    graph = Graph(example_polygons() + [[Point(-10, 1 - 1e-13),
+                                         Point(-9, 1 + 1e-13),
+                                         Point(-9.5, 3)]])
+    edges = list(graph.get_edges())
+    index = interval_index(graph, 1 / T2)
+    assert interval_index(graph, 1 / T2) is index
+    for k in range(400):
+        p = Point(-2 + 0.25 * (k % 20), -1 + 0.25 * (k // 20))
+        found = index.query(p, INF)
+        crossing = [e for e in edges if edge_intersect(p, Point(INF, p.y), e)]
+        assert set(crossing) <= set(found)
+        assert found == [e for e in edges if e in found]
+    flat = Edge(Point(-10, 1 - 1e-13), Point(-9, 1 + 1e-13))
+    assert edge_intersect(Point(0, 1), Point(INF, 1), flat)
+    assert flat in index.query(Point(0, 1), INF)
+    graph.add_polygon([Point(19, 0), Point(21, 0), Point(20, 2)])
+    assert interval_index(graph, 1 / T2) is not index
+    # The index of a CombinedGraph is made from those of its graphs
+    combined = CombinedGraph(graph, Graph([[Point(1, -3), Point(4, -3),
+                                            Point(2, 0.5)]]))
+    index = interval_index(combined, 1 / T2)
+    edges = combined.get_edges()
+    for k in range(400):
+        p = Point(-2 + 0.25 * (k % 20), -4 + 0.25 * (k // 20))
+        crossing = [e for e in edges if edge_intersect(p, Point(INF, p.y), e)]
+        assert set(crossing) <= set(index.query(p, INF))
+
+
+def test_points_in_polygons():
+    np = pytest.importorskip('numpy')
+    g = vg.VisGraph()
+    g.graph = Graph(example_polygons() + [[Point(10, 0), Point(12, 0),
+                                           Point(11, 2)]])
+    # Points on a grid hit vertices and horizontal edges as well
+    xy = np.array([(0.5 * i, 0.25 * j) for i in range(-2, 28)
+                   for j in range(-2, 28)])
+    expected = [g.point_in_polygon(Point(x, y)) for x, y in xy]
+    assert g.points_in_polygons(xy).tolist() == expected
+    assert g.points_in_polygons(np.empty((0, 2))).tolist() == []
+
+
 class TestClosestPoint:
 
     def setup_method(self, method):
@@ -183,6 +972,287 @@ class TestClosestPoint:
         cp = g.closest_point(p, pid, length=0.001)
         assert g.point_in_polygon(cp) == -1
 
+    def test_closest_edge_point(self):
+        # Enough edges for a tree of a few levels, and points on a grid to
+        # get ties between edges
+        star = [Point((3 + 2 * (k % 2)) * cos(k * pi / 150),
+                      (3 + 2 * (k % 2)) * sin(k * pi / 150))
+                for k in range(300)]
+        graph = Graph([star, [self.point_a, self.point_b, self.point_c]])
+        index = polygon_index(graph)
+        assert len(index.tree().roots) == 2
+        for polygon_id in (0, 1):
+            edges = list(graph.polygons[polygon_id])
+            for k in range(400):
+                p = Point(-5 + 0.5 * (k % 20), -5 + 0.5 * (k // 20))
+                closest = min(
+                    (edge_distance(p, c), i, e, c) for i, (e, c) in enumerate(
+                        (e, self._closest_on_edge(p, e)) for e in edges))
+                edge, c = index.closest_edge_point(p, polygon_id)
+                assert (edge, c) == (closest[2], closest[3])
+
+    @staticmethod
+    def _closest_on_edge(p, e):
+        num = ((p.x-e.p1.x)*(e.p2.x-e.p1.x) + (p.y-e.p1.y)*(e.p2.y-e.p1.y))
+        u = num / ((e.p2.x - e.p1.x)**2 + (e.p2.y - e.p1.y)**2)
+        if u < 0:
+            return e.p1
+        if u > 1:
+            return e.p2
+        return Point(e.p1.x + u*(e.p2.x - e.p1.x), e.p1.y + u*(e.p2.y- e.p1.y))
+
+    def test_closest_points(self):
+        pytest.importorskip('numpy')
+        g = vg.VisGraph()
+        g.build([[Point(0,1), Point(2,0), Point(1,1), Point(2,2)],
+                 [self.point_a, self.point_b, self.point_c]])
+        points = [Point(1,0.9), Point(0.5,1), self.point_d, Point(3,1),
+                  Point(5,5)]
+        ids = g.points_in_polygons([(p.x, p.y) for p in points])
+        assert ids.tolist() == [g.point_in_polygon(p) for p in points]
+        cps = g.closest_points([(p.x, p.y) for p in points], ids, 0.01)
+        for p, pid, cp in zip(points, ids, cps):
+            expected = p if pid == -1 else g.closest_point(p, pid, 0.01)
+            assert tuple(cp) == (expected.x, expected.y)
+
+
+class TestShortestPathTree:
+
+    def setup_method(self, method):
+        self.g = vg.VisGraph()
+        self.g.build([[Point(0.0, 1.0), Point(3.0, 1.0), Point(1.5, 4.0)],
+                      [Point(4.0, 4.0), Point(7.0, 4.0), Point(5.5, 8.0)]],
+                     status=False)
+        self.origin = Point(1.5, 0.0)
+        self.destinations = [Point(4.0, 6.0), Point(1.5, 4.0), Point(8.0, 9.0),
+                             Point(-1.0, 3.0)]
+
+    def check_tree(self):
+        tree = self.g.shortest_path_tree(self.origin, self.destinations)
+        assert set(tree.distances) == set(self.destinations)
+        for d in self.destinations:
+            shortest = self.g.shortest_path(self.origin, d)
+            assert tree.path(d) == shortest
+            length = sum(edge_distance(a, b)
+                         for a, b in zip(shortest, shortest[1:]))
+            assert abs(tree.distances[d] - length) < 1e-9
+        assert tree.distance(self.origin) == 0
+
+    def test_shortest_path_tree(self):
+        self.check_tree()
+
+    def test_shortest_path_tree_compact(self):
+        self.g.compact()
+        self.check_tree()
+
+    def test_shortest_path_tree_all(self):
+        tree = self.g.shortest_path_tree(self.origin)
+        assert set(tree.distances) == set(self.g.visgraph.get_points() +
+                                          [self.origin])
+        assert Point(4.0, 6.0) not in tree
+
+
+class TestDistanceMatrix:
+
+    def setup_method(self, method):
+        self.g = vg.VisGraph()
+        self.g.build([[Point(0.0, 1.0), Point(3.0, 1.0), Point(1.5, 4.0)],
+                      [Point(4.0, 4.0), Point(7.0, 4.0), Point(5.5, 8.0)]],
+                     status=False)
+        self.points = [Point(1.5, 0.0), Point(4.0, 6.0), Point(1.5, 4.0),
+                       Point(8.0, 9.0)]
+
+    def check_matrix(self, workers):
+        matrix, preds = self.g.distance_matrix(self.points, workers=workers,
+                                               predecessors=True,
+                                               status=False)
+        assert matrix.shape == (4, 4)
+        for i, a in enumerate(self.points):
+            assert matrix[i][i] == 0
+            for j, b in enumerate(self.points):
+                if i == j:
+                    continue
+                shortest = self.g.shortest_path(a, b)
+                length = sum(edge_distance(p, q)
+                             for p, q in zip(shortest, shortest[1:]))
+                assert abs(matrix[i][j] - length) < 1e-9
+                path = [b]
+                while path[-1] != a:
+                    path.append(preds[i][path[-1]])
+                assert path[::-1] == shortest
+
+    def test_distance_matrix(self):
+        pytest.importorskip('numpy')
+        self.check_matrix(1)
+        # Nothing is left behind in the module state
+        assert pyvisgraph.vis_graph._distance_state is None
+
+    def test_distance_matrix_2_workers(self):
+        pytest.importorskip('numpy')
+        self.check_matrix(2)
+
+    def test_distance_matrix_compact(self):
+        pytest.importorskip('numpy')
+        self.g.compact()
+        self.check_matrix(1)
+
+
+class TestCompactGraph:
+
+    def setup_method(self, method):
+        self.g = vg.VisGraph()
+        self.g.build([[Point(0.0, 1.0), Point(3.0, 1.0), Point(1.5, 4.0)],
+                      [Point(4.0, 4.0), Point(7.0, 4.0), Point(5.5, 8.0)]],
+                     status=False)
+        self.origin = Point(1.5, 0.0)
+        self.destination = Point(4.0, 6.0)
+
+    def test_same_edges(self):
+        edges = self.g.visgraph.get_edges()
+        self.g.compact()
+        assert isinstance(self.g.visgraph, vg.CompactGraph)
+        assert self.g.visgraph.get_edges() == edges
+        assert Point(3.0, 1.0) in self.g.visgraph
+        assert Point(3.0, 2.0) not in self.g.visgraph
+        assert Edge(Point(3.0, 1.0), Point(4.0, 4.0)) in self.g.visgraph
+        assert self.g.visgraph.vertex_id(Point(3.0, 2.0)) == -1
+
+    def test_shortest_path(self):
+        shortest = self.g.shortest_path(self.origin, self.destination)
+        self.g.compact()
+        assert self.g.shortest_path(self.origin, self.destination) == shortest
+        assert (self.g.shortest_path(Point(0.0, 1.0), Point(5.5, 8.0)) ==
+                [Point(0.0, 1.0), Point(1.5, 4.0), Point(5.5, 8.0)])
+
+    def test_shortest_path_no_lengths(self):
+        shortest = self.g.shortest_path(self.origin, self.destination)
+        self.g.compact(lengths=False)
+        assert self.g.visgraph.lengths is None
+        assert self.g.shortest_path(self.origin, self.destination) == shortest
+
+    def test_shortest_path_astar(self):
+        shortest = self.g.shortest_path(self.origin, self.destination)
+        assert self.g.shortest_path(self.origin, self.destination,
+                                    algorithm='astar') == shortest
+        self.g.compact()
+        assert self.g.shortest_path(self.origin, self.destination,
+                                    algorithm='astar') == shortest
+
+    def test_save_load(self, tmp_path):
+        self.g.compact()
+        filename = str(tmp_path / 'graph.pk1')
+        self.g.save(filename)
+        g2 = vg.VisGraph()
+        g2.load(filename)
+        assert isinstance(g2.visgraph, vg.CompactGraph)
+        assert g2.visgraph.get_edges() == self.g.visgraph.get_edges()
+        assert list(g2.visgraph.lengths) == list(self.g.visgraph.lengths)
+
+    def test_save_load_binary(self, tmp_path):
+        shortest = self.g.shortest_path(self.origin, self.destination)
+        visible = self.g.find_visible(self.origin)
+        filename = str(tmp_path / 'graph.pvg')
+        self.g.save(filename, binary=True)
+        g2 = vg.VisGraph()
+        g2.load(filename)
+        assert isinstance(g2.visgraph, vg.CompactGraph)
+        assert g2.visgraph.get_edges() == self.g.visgraph.get_edges()
+        assert g2.graph.get_edges() == self.g.graph.get_edges()
+        assert dict(g2.graph.polygons) == dict(self.g.graph.polygons)
+        assert g2.shortest_path(self.origin, self.destination) == shortest
+        assert set(g2.find_visible(self.origin)) == set(visible)
+        assert g2.point_in_polygon(Point(1.5, 2.0)) == 0
+        assert g2.point_in_polygon(Point(3.5, 2.0)) == -1
+
+    def test_binary_read_only(self, tmp_path):
+        filename = str(tmp_path / 'graph.pvg')
+        self.g.save(filename, binary=True)
+        g2 = vg.VisGraph()
+        g2.load(filename)
+        assert isinstance(g2.graph, vg.CompactGraph)
+        if sys.version_info[0] == 3:
+            assert isinstance(g2.graph.xs, memoryview)
+        assert g2.graph.polygons[1] == self.g.graph.polygons[1]
+        # Polygon Edges are not kept around between lookups
+        assert g2.graph.polygons[1] is not g2.graph.polygons[1]
+        assert list(g2.graph.polygons) == [0, 1]
+        with pytest.raises(KeyError):
+            g2.graph.polygons[2]
+        with pytest.raises(TypeError):
+            g2.update([Point(3.5, 2.0)])
+
+    def test_binary_indexes(self, tmp_path, monkeypatch):
+        filename = str(tmp_path / 'graph.pvg')
+        self.g.save(filename, binary=True)
+        g2 = vg.VisGraph()
+        g2.load(filename)
+        visible = set(g2.find_visible(self.origin))
+        inside = g2.point_in_polygon(Point(1.5, 2.0))
+        g2.graph._polygon_index = g2.graph._interval_index = None
+        # The indexes are built from the arrays, without Points or Edges
+        with monkeypatch.context() as patch:
+            patch.setattr(vg.CompactGraph, 'point', None)
+            patch.setattr(vg.CompactGraph, 'polygons', None)
+            polygon_index(g2.graph)
+            interval_index(g2.graph, 1 / T2)
+        assert isinstance(g2.graph._interval_index.edges, array)
+        assert set(g2.find_visible(self.origin)) == visible
+        assert g2.point_in_polygon(Point(1.5, 2.0)) == inside
+
+    def test_convert_pickle(self, tmp_path):
+        pickled = str(tmp_path / 'graph.pk1')
+        binary = str(tmp_path / 'graph.pvg')
+        self.g.save(pickled)
+        g2 = vg.VisGraph()
+        g2.load(pickled)
+        g2.save(binary, binary=True)
+        g3 = vg.VisGraph()
+        g3.load(binary)
+        assert g3.visgraph.get_edges() == self.g.visgraph.get_edges()
+        # A graph loaded from a binary file can be pickled again
+        g3.save(pickled)
+        g4 = vg.VisGraph()
+        g4.load(pickled)
+        assert g4.visgraph.get_edges() == self.g.visgraph.get_edges()
+
+    def test_overlay_ids(self):
+        self.g.compact()
+        overlay = Overlay(self.g.visgraph)
+        n = len(self.g.visgraph)
+        points = [Point(0.5 * k, -1.0) for k in range(50)]
+        assert [overlay.vertex_id(p) for p in points] == list(range(n, n + 50))
+        assert overlay.find(Point(2.0, -1.0)) == n + 4
+        assert overlay.find(Point(2.0, -2.0)) == -1
+        assert overlay.find(Point(3.0, 1.0)) < n
+        assert overlay.point(n + 4) == Point(2.0, -1.0)
+
+    def test_binary_sort_by_angle(self, tmp_path, monkeypatch):
+        pytest.importorskip('numpy')
+        monkeypatch.setattr(pvg_visible_vertices, 'KERNEL_SIZE', 1)
+        visible = set(self.g.find_visible(self.origin))
+        filename = str(tmp_path / 'graph.pvg')
+        self.g.save(filename, binary=True)
+        g2 = vg.VisGraph()
+        g2.load(filename)
+        assert set(g2.find_visible(self.origin)) == visible
+        # No Points are kept on the graph for the NumPy sort
+        assert getattr(g2.graph, '_point_arrays', None) is None
+
+    def test_binary_typecodes(self):
+        # Python 2 reads and writes the 'q' sections with 'l' arrays
+        for typecode in 'bidq':
+            assert (array(_array_typecode(typecode)).itemsize ==
+                    struct.calcsize('<' + typecode))
+
+    def test_binary_version(self, tmp_path):
+        filename = str(tmp_path / 'graph.pvg')
+        self.g.save(filename, binary=True)
+        with open(filename, 'r+b') as f:
+            f.seek(4)
+            f.write(struct.pack('<I', 99))
+        with pytest.raises(ValueError):
+            vg.VisGraph().load(filename)
+
 
 class TestCollinear:
 
@@ -241,6 +1311,9 @@ class TestCollinear:
         assert verts[3] not in visible
         assert verts[1] not in shortest
         assert verts[3] not in shortest
+        shortest = g.shortest_path(s, t, algorithm='astar')
+        assert verts[1] not in shortest
+        assert verts[3] not in shortest
 
     """ See https://github.com/TaipanRex/pyvisgraph/issues/20.
     This tests colinearity case #1 using point_in_polygon."""